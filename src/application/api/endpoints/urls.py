@@ -1,61 +1,139 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
 from sqlalchemy.orm import Session
-from typing import Optional
-from datetime import datetime, timezone
+from typing import List, Optional, Tuple, Union
+from datetime import datetime, timedelta, timezone
 from ...db.session import get_db
-from ...schemas.url import URLCreate, URLUpdate, URLResponse, URLStats
+from ...schemas.url import (
+    URLCreate, URLUpdate, URLResponse, URLStats, TrendingWindow, TrendingLink,
+    URLBulkSelector, URLBulkUpdate, URLBulkItemResult, URLBulkResult,
+    URLStatsBatchRequest, URLStatsBatchItem, URLStatsBatchResult, URLSearchPage
+)
 from ...services import url_service
 from ...services import user_service
-from ...core.security import get_current_user
+from ...services import analytics_service
+from ...core.security import get_current_user, get_current_user_id
+from ...core.config import settings
+from ...core import http_cache, deadline, idempotency
+from ...db.cache import cache_fallback
 from ...schemas.user import User
 from fastapi.responses import RedirectResponse
+from starlette.background import BackgroundTask
+import base64
+import binascii
+import json
+import redis
 
 router = APIRouter()
 
+IdempotencyKey = Header(
+    None,
+    alias="Idempotency-Key",
+    max_length=255,
+    description="Retries with the same key get the first response back instead of repeating the request"
+)
+
 @router.post("/shorten", response_model=URLResponse)
 def create_short_url(
     url: URLCreate,
+    response: Response,
+    idempotency_key: Optional[str] = IdempotencyKey,
     db: Session = Depends(get_db),
-    current_user: Optional[User] = Depends(get_current_user)
+    user_id: int = Depends(get_current_user_id)
 ):
-    """Create a new short URL."""
-    
-    existing_url = url_service.search_url_by_original(db, str(url.original_url))
-    if existing_url and existing_url.owner_id == current_user.id:
-        return URLResponse(
-            short_url=f"/{existing_url.short_code}",
-            original_url=existing_url.original_url,
-            custom_alias=existing_url.custom_alias,
-            expires_at=existing_url.expires_at
-        )
-    
-    if url.custom_alias:
-        existing_url = url_service.get_url_by_short_code(db, url.custom_alias)
-        if existing_url:
+    """Create a new short URL, or return the caller's existing link to the same URL."""
+    def create():
+        current_user = get_current_user(db, user_id)
+        db_url = url_service.create_url(db, url, current_user.id)
+        if db_url is None:
             raise HTTPException(
                 status_code=400,
                 detail="Custom alias already taken"
             )
+        return URLResponse(
+            short_url=f"/{db_url.short_code}",
+            original_url=db_url.original_url,
+            custom_alias=db_url.custom_alias,
+            expires_at=db_url.expires_at
+        )
     
-    db_url = url_service.create_url(db, url, current_user.id)
-    return URLResponse(
-        short_url=f"/{db_url.short_code}",
-        original_url=db_url.original_url,
-        custom_alias=db_url.custom_alias,
-        expires_at=db_url.expires_at
+    return idempotency.execute(
+        user_id, idempotency_key, idempotency.fingerprint("shorten", url), response, create
     )
 
-@router.get("/search")
-def search_url(
-    original_url: str = Query(..., description="Original URL to search for"),
+def _bulk_result(selector: URLBulkSelector, affected: List[str], status: str) -> URLBulkResult:
+    if selector.short_codes is None:
+        results = [URLBulkItemResult(short_code=code, status=status) for code in affected]
+    else:
+        done = set(affected)
+        results = [
+            URLBulkItemResult(short_code=code, status=status if code in done else "not_found")
+            for code in dict.fromkeys(selector.short_codes)
+        ]
+    return URLBulkResult(affected=len(affected), results=results)
+
+@router.delete("", response_model=URLBulkResult)
+def bulk_delete_urls(
+    selector: URLBulkSelector,
+    response: Response,
+    idempotency_key: Optional[str] = IdempotencyKey,
     db: Session = Depends(get_db),
-    current_user: Optional[User] = Depends(get_current_user)
+    user_id: int = Depends(get_current_user_id)
 ):
-    """Search for a URL by its original URL."""
-    original_url = original_url.rstrip('/')
-    url = url_service.search_url_by_original(db, original_url, current_user.id if current_user else None)
-    if not url:
-        raise HTTPException(status_code=404, detail="URL not found")
+    """Delete many of the current user's URLs by code list or expiry range."""
+    def delete():
+        current_user = get_current_user(db, user_id)
+        deleted = url_service.bulk_delete_urls(db, current_user.id, selector)
+        return _bulk_result(selector, deleted, "deleted")
+    
+    return idempotency.execute(
+        user_id, idempotency_key, idempotency.fingerprint("bulk_delete", selector), response, delete
+    )
+
+@router.patch("", response_model=URLBulkResult)
+def bulk_update_urls(
+    bulk_update: URLBulkUpdate,
+    response: Response,
+    idempotency_key: Optional[str] = IdempotencyKey,
+    db: Session = Depends(get_db),
+    user_id: int = Depends(get_current_user_id)
+):
+    """Update many of the current user's URLs by code list or expiry range."""
+    def update():
+        current_user = get_current_user(db, user_id)
+        updated = url_service.bulk_update_urls(db, current_user.id, bulk_update, bulk_update.update)
+        return _bulk_result(bulk_update, updated, "updated")
+    
+    return idempotency.execute(
+        user_id, idempotency_key, idempotency.fingerprint("bulk_update", bulk_update), response, update
+    )
+
+@router.post("/stats/batch", response_model=URLStatsBatchResult)
+def get_url_stats_batch(body: URLStatsBatchRequest, db: Session = Depends(get_db)):
+    """Get statistics for many URLs at once, in request order.
+
+    Unique visitors are not included; use the single-link stats endpoint for them.
+    """
+    records = url_service.get_url_stats_batch(db, body.short_codes)
+    return URLStatsBatchResult(results=[
+        URLStatsBatchItem(
+            short_code=short_code,
+            found=url is not None,
+            stats=URLStats(**url._asdict()) if url is not None else None
+        )
+        for short_code, url in zip(body.short_codes, records)
+    ])
+
+def _encode_cursor(after: Tuple[str, str]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(after).encode()).decode()
+
+def _decode_cursor(cursor: str) -> Tuple[str, str]:
+    try:
+        search_key, short_code = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        raise HTTPException(status_code=422, detail="Invalid cursor")
+    return str(search_key), str(short_code)
+
+def _url_response(url) -> URLResponse:
     return URLResponse(
         short_url=f"/{url.short_code}",
         original_url=url.original_url,
@@ -63,10 +141,67 @@ def search_url(
         expires_at=url.expires_at
     )
 
+@router.get("/search", response_model=Union[URLResponse, URLSearchPage])
+def search_url(
+    original_url: Optional[str] = Query(None, description="Original URL to search for"),
+    domain: Optional[str] = Query(None, description="List links to this domain and its subdomains"),
+    prefix: Optional[str] = Query(None, description="List links whose URL starts with this (scheme is ignored)"),
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    db: Session = Depends(get_db),
+    current_user: Optional[User] = Depends(get_current_user)
+):
+    """Search for a URL by its original URL, or page through the caller's
+    links by domain or URL prefix.
+
+    Domain and prefix searches are index range scans, ordered by reversed
+    host and path; pass next_cursor back as `cursor` for the next page.
+    """
+    if sum(value is not None for value in (original_url, domain, prefix)) != 1:
+        raise HTTPException(status_code=422, detail="Provide exactly one of original_url, domain or prefix")
+    
+    if original_url is not None:
+        original_url = original_url.rstrip('/')
+        url = url_service.search_url_by_original(db, original_url, current_user.id if current_user else None)
+        if not url:
+            raise HTTPException(status_code=404, detail="URL not found")
+        return _url_response(url)
+    
+    key_range = url_service.search_key_range(domain=domain, prefix=prefix)
+    if key_range is None:
+        raise HTTPException(status_code=422, detail="Search needs a host name")
+    after = _decode_cursor(cursor) if cursor else None
+    urls, next_after = url_service.search_urls(db, current_user.id, key_range, limit, after)
+    return URLSearchPage(
+        items=[_url_response(url) for url in urls],
+        next_cursor=_encode_cursor(next_after) if next_after else None
+    )
+
+@router.get("/trending", response_model=List[TrendingLink])
+def get_trending_links(
+    window: TrendingWindow = Query(TrendingWindow.hour, description="Decay half-life of the ranking"),
+    limit: int = Query(10, ge=1, le=100)
+):
+    """Get the most clicked links, with older clicks decaying over the window."""
+    try:
+        trending = analytics_service.top_trending(window.value, limit)
+    except redis.RedisError:
+        raise HTTPException(status_code=503, detail="Trending is temporarily unavailable")
+    return [TrendingLink(short_code=short_code, score=score) for short_code, score in trending]
+
+def _record_redirect(short_code: str, ip: Optional[str], user_agent: Optional[str]) -> None:
+    # Runs after the response is sent, so the request deadline no longer applies
+    with deadline.scope(None), cache_fallback("analytics"):
+        analytics_service.record_redirect(short_code, ip, user_agent)
+
 @router.get("/{short_code}")
-async def redirect_to_url(short_code: str, db: Session = Depends(get_db)):
-    """Redirect to the original URL."""
-    url = url_service.get_url_by_short_code(db, short_code)
+def redirect_to_url(short_code: str, request: Request, db: Session = Depends(get_db)):
+    """Redirect to the original URL.
+
+    A plain def like the other routes: resolving blocks on Redis or the
+    database, so it runs in the threadpool and the deadline can fire.
+    """
+    url = url_service.resolve_redirect(db, short_code)
     if not url:
         raise HTTPException(status_code=404, detail="URL not found")
     
@@ -74,8 +209,22 @@ async def redirect_to_url(short_code: str, db: Session = Depends(get_db)):
     if url.expires_at and url.expires_at.replace(tzinfo=timezone.utc) < current_time:
         raise HTTPException(status_code=410, detail="URL has expired")
     
-    url_service.increment_access_count(db, short_code)
-    return RedirectResponse(url=url.original_url, status_code=307)
+    return RedirectResponse(
+        url=url.original_url,
+        status_code=settings.REDIRECT_STATUS_CODE,
+        headers={
+            "Cache-Control": http_cache.redirect_cache_control(
+                settings.REDIRECT_CACHE_MAX_AGE, url.expires_at, current_time
+            )
+        },
+        # Analytics run after the response so the redirect itself costs one Redis call
+        background=BackgroundTask(
+            _record_redirect,
+            short_code,
+            request.client.host if request.client else None,
+            request.headers.get("user-agent")
+        )
+    )
 
 @router.delete("/{short_code}")
 def delete_url(
@@ -124,20 +273,53 @@ def update_url(
     )
 
 @router.get("/{short_code}/stats", response_model=URLStats)
-def get_url_stats(short_code: str, db: Session = Depends(get_db)):
-    """Get statistics for a URL."""
+def get_url_stats(
+    short_code: str,
+    request: Request,
+    response: Response,
+    days: int = Query(
+        30, ge=1, le=settings.UNIQUE_VISITORS_RETENTION_DAYS,
+        description="Number of days (including today) to count unique visitors over"
+    ),
+    db: Session = Depends(get_db)
+):
+    """Get statistics for a URL (supports If-None-Match / If-Modified-Since)."""
     url = url_service.get_url_stats(db, short_code)
     if not url:
         raise HTTPException(status_code=404, detail="URL not found")
     
+    today = datetime.utcnow().date()
+    unique_visitors = None
+    with cache_fallback("analytics"):
+        unique_visitors = analytics_service.count_unique_visitors(
+            short_code, today - timedelta(days=days - 1), today
+        )
+    etag = http_cache.make_etag(
+        url.short_code, url.original_url, url.expires_at,
+        url.access_count, url.last_accessed_at, url.updated_at, days, unique_visitors
+    )
+    modified = http_cache.last_modified(url.created_at, url.updated_at, url.last_accessed_at)
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={settings.STATS_CACHE_MAX_AGE}"
+    }
+    if modified:
+        headers["Last-Modified"] = http_cache.http_date(modified)
+    
+    if http_cache.is_not_modified(request, etag, modified):
+        return Response(status_code=304, headers=headers)
+    
+    response.headers.update(headers)
     return URLStats(
         id=url.id,
         original_url=url.original_url,
         short_code=url.short_code,
         custom_alias=url.custom_alias,
         created_at=url.created_at,
+        updated_at=url.updated_at,
         expires_at=url.expires_at,
         last_accessed_at=url.last_accessed_at,
         access_count=url.access_count,
-        owner_id=url.owner_id
-    ) 
\ No newline at end of file
+        owner_id=url.owner_id,
+        unique_visitors=unique_visitors
+    )
@@ -1,12 +1,11 @@
-from datetime import timedelta
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from ...db.session import get_db
-from ...schemas.user import UserCreate, User, Token, UserUpdate
-from ...services import user_service
+from ...schemas.user import UserCreate, User, Token, TokenRefresh, UserUpdate, OwnerStats
+from ...services import user_service, owner_stats_service
 from ...core.security import get_current_user
-from ...core.config import settings
+import redis
 
 router = APIRouter()
 
@@ -35,17 +34,56 @@ def login(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = user_service.create_access_token(
-        data={"sub": str(user.id)}, expires_delta=access_token_expires
-    )
-    return {"access_token": access_token, "token_type": "bearer"}
+    return user_service.issue_tokens(user.id)
+
+@router.post("/token/refresh", response_model=Token)
+def refresh_token(body: TokenRefresh):
+    """Exchange a refresh token for a new access token and refresh token.
+
+    Each refresh token works once; the response carries its replacement.
+    """
+    try:
+        rotated = user_service.rotate_refresh_token(body.refresh_token)
+    except redis.RedisError:
+        raise HTTPException(status_code=503, detail="Token refresh is temporarily unavailable")
+    if rotated is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or expired refresh token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    user_id, new_refresh_token = rotated
+    return user_service.issue_tokens(user_id, new_refresh_token)
+
+@router.post("/token/revoke")
+def revoke_token(body: TokenRefresh):
+    """Revoke a refresh token (logout)."""
+    try:
+        user_service.revoke_refresh_token(body.refresh_token)
+    except redis.RedisError:
+        raise HTTPException(status_code=503, detail="Token revocation is temporarily unavailable")
+    return {"message": "Token revoked"}
 
 @router.get("/me", response_model=User)
 def read_users_me(current_user: User = Depends(get_current_user)):
     """Get current user information."""
     return current_user
 
+@router.get("/me/stats", response_model=OwnerStats)
+def read_users_me_stats(
+    top: int = Query(5, ge=1, le=50, description="Number of most clicked links to include"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get a summary of the current user's links, from precomputed aggregates.
+
+    Clicks are counted once flushed to the database, a few seconds after the redirect.
+    """
+    try:
+        return owner_stats_service.get_owner_stats(db, current_user.id, top)
+    except redis.RedisError:
+        raise HTTPException(status_code=503, detail="Link stats are temporarily unavailable")
+
 @router.put("/me", response_model=User)
 def update_user_me(
     user_update: UserUpdate,
@@ -53,7 +91,10 @@ def update_user_me(
     db: Session = Depends(get_db)
 ):
     """Update current user information."""
-    updated_user = user_service.update_user(db, current_user.id, user_update)
+    try:
+        updated_user = user_service.update_user(db, current_user.id, user_update)
+    except redis.RedisError:
+        raise HTTPException(status_code=503, detail="Password change is temporarily unavailable")
     if not updated_user:
         raise HTTPException(
             status_code=400,
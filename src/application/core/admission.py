@@ -0,0 +1,119 @@
+import asyncio
+import enum
+import time
+from typing import Dict, Optional
+from anyio import to_thread
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from .config import settings
+from .metrics import metrics
+from . import deadline
+
+
+class Priority(enum.IntEnum):
+    HIGH = 0
+    NORMAL = 1
+    LOW = 2
+
+
+class AdmissionController:
+    """Decides whether to take on a request, from its priority, the number of
+    requests in flight, free worker threads and how long work waits for one.
+
+    Low priority requests are shed once the queue wait passes the target or
+    no more than `reserved_threads` workers are free; normal ones at
+    `normal_factor` times the target or half the reserve. Every request is
+    shed once `max_in_flight` are in flight. Redirects (high priority) thus
+    always find the reserved workers free. The queue wait is a moving average
+    fed by probe_queue_wait.
+    """
+
+    def __init__(
+        self,
+        target_queue_wait: float,
+        max_in_flight: int,
+        reserved_threads: int = 0,
+        normal_factor: float = 4.0,
+        smoothing: float = 0.3
+    ):
+        self.target_queue_wait = target_queue_wait
+        self.max_in_flight = max_in_flight
+        self.reserved_threads = reserved_threads
+        self.normal_factor = normal_factor
+        self.smoothing = smoothing
+        self.in_flight = 0
+        self.queue_wait = 0.0
+
+    def observe_queue_wait(self, seconds: float) -> None:
+        self.queue_wait += self.smoothing * (seconds - self.queue_wait)
+        metrics.set_gauge("admission.queue_wait_ms", round(self.queue_wait * 1000, 1))
+
+    def _overloaded(self, priority: Priority, free_threads: Optional[int]) -> bool:
+        if priority == Priority.HIGH:
+            return False
+        if priority == Priority.LOW:
+            wait_limit, reserve = self.target_queue_wait, self.reserved_threads
+        else:
+            wait_limit, reserve = self.target_queue_wait * self.normal_factor, self.reserved_threads // 2
+        if free_threads is not None and free_threads <= reserve:
+            return True
+        return self.queue_wait > wait_limit
+
+    def try_admit(self, priority: Priority, free_threads: Optional[int] = None) -> bool:
+        """Count the request in and return True, or return False to shed it.
+
+        `free_threads` is the number of idle workers right now, if known.
+        """
+        if self.in_flight >= self.max_in_flight or self._overloaded(priority, free_threads):
+            metrics.incr("requests.shed")
+            metrics.incr(f"requests.shed.{priority.name.lower()}")
+            return False
+        self.in_flight += 1
+        metrics.set_gauge("admission.in_flight", self.in_flight)
+        return True
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        metrics.set_gauge("admission.in_flight", self.in_flight)
+
+
+def priority_for(request: Request, priorities: Dict[str, str] = None) -> Priority:
+    """Priority of the route a request matches; NORMAL unless configured."""
+    priorities = settings.ADMISSION_ROUTE_PRIORITIES if priorities is None else priorities
+    name = priorities.get(deadline.route_key(request), "normal")
+    return Priority[name.upper()]
+
+
+def free_threads() -> int:
+    """Idle worker threads of the default pool; call from the event loop."""
+    limiter = to_thread.current_default_thread_limiter()
+    return int(limiter.total_tokens - limiter.borrowed_tokens)
+
+
+def set_threadpool_size(size: int) -> None:
+    """Resize the worker threads sync handlers run on; call from the event loop."""
+    to_thread.current_default_thread_limiter().total_tokens = size
+    metrics.set_gauge("threadpool.size", size)
+
+
+async def probe_queue_wait(controller: AdmissionController, interval: float) -> None:
+    """Measure how long a no-op waits for a worker thread, every `interval` seconds.
+
+    The probe queues behind real work, so it also sees work that requests
+    left behind when they timed out.
+    """
+    limiter = to_thread.current_default_thread_limiter()
+    while True:
+        queued_at = time.monotonic()
+        started_at = await run_in_threadpool(time.monotonic)
+        controller.observe_queue_wait(started_at - queued_at)
+        metrics.set_gauge("threadpool.queue_depth", limiter.statistics().tasks_waiting)
+        metrics.set_gauge("threadpool.busy", limiter.borrowed_tokens)
+        await asyncio.sleep(interval)
+
+
+admission_controller = AdmissionController(
+    target_queue_wait=settings.ADMISSION_TARGET_QUEUE_WAIT_MS / 1000,
+    max_in_flight=settings.ADMISSION_MAX_IN_FLIGHT,
+    reserved_threads=settings.ADMISSION_RESERVED_THREADS
+)
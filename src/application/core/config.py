@@ -1,5 +1,6 @@
+from pydantic import field_validator
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Dict, List, Literal, Optional, Tuple
 import secrets
 
 class Settings(BaseSettings):
@@ -9,7 +10,8 @@ class Settings(BaseSettings):
     
     # Security settings
     SECRET_KEY: str = secrets.token_urlsafe(32)
-    ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 8  # 8 days
+    ACCESS_TOKEN_EXPIRE_MINUTES: int = 15  # renewed through POST /users/token/refresh
+    REFRESH_TOKEN_EXPIRE_DAYS: int = 30
     
     # Database settings
     POSTGRES_SERVER: str
@@ -17,21 +19,119 @@ class Settings(BaseSettings):
     POSTGRES_PASSWORD: str
     POSTGRES_DB: str
     
+    # Connections per worker; cache hits never check one out
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    
+    # Comma-separated SQLAlchemy URLs of extra link databases. Links are spread
+    # over the main database (shard 0) and these by short code; the list must
+    # not change once links are stored.
+    DATABASE_SHARDS: str = ""
+    
     # Redis settings
     REDIS_HOST: str
     REDIS_PORT: int = 6379
+    # Comma-separated "host:port" list of cache nodes; empty means REDIS_HOST/REDIS_PORT only
+    REDIS_NODES: str = ""
+    REDIS_SOCKET_TIMEOUT: float = 0.1  # seconds per connect / call
+    CACHE_BREAKER_FAILURE_THRESHOLD: int = 5
+    CACHE_BREAKER_RESET_TIMEOUT: float = 5.0  # seconds before probing a failed node
+    
+    # Query instrumentation
+    SLOW_QUERY_THRESHOLD_MS: float = 100.0
+    REQUEST_QUERY_BUDGET: int = 10  # warn when a request runs more statements
+    
+    # Request deadlines in milliseconds, per "METHOD /route/{template}" or the default.
+    # The remaining time becomes the Postgres statement/lock timeout.
+    REQUEST_DEADLINE_MS: float = 5000.0
+    ROUTE_DEADLINES_MS: Dict[str, float] = {
+        "GET /api/v1/links/{short_code}": 1000.0,
+        "GET /api/v1/links/search": 2000.0,
+    }
+    
+    # Worker threads for sync handlers and dependencies (Starlette's default is 40)
+    THREADPOOL_SIZE: int = 40
+    
+    # Load shedding: low priority routes get 503 once requests wait longer than
+    # the target for a worker thread or only ADMISSION_RESERVED_THREADS workers
+    # are idle, normal ones at 4x the target or half the reserve, and every
+    # route once ADMISSION_MAX_IN_FLIGHT requests are in flight. The wait is
+    # probed every ADMISSION_PROBE_INTERVAL seconds (0 disables probing).
+    ADMISSION_TARGET_QUEUE_WAIT_MS: float = 50.0
+    ADMISSION_RESERVED_THREADS: int = 4  # kept free for high priority routes
+    ADMISSION_MAX_IN_FLIGHT: int = 200
+    ADMISSION_PROBE_INTERVAL: float = 0.1
+    ADMISSION_ROUTE_PRIORITIES: Dict[str, str] = {
+        "GET /api/v1/links/{short_code}": "high",
+        "GET /metrics": "high",
+        "POST /api/v1/users/register": "low",
+        "GET /api/v1/links/search": "low",
+        "GET /api/v1/links/{short_code}/stats": "low",
+        "POST /api/v1/links/stats/batch": "low",
+        "GET /api/v1/users/me/stats": "low",
+    }
+    
+    # Seconds between flushes of buffered clicks to the database (0 disables)
+    CLICK_FLUSH_INTERVAL: float = 5.0
+    
+    # Redirect snapshot used when the database is down (empty SNAPSHOT_DIR disables it).
+    # The delta is rewritten every SNAPSHOT_REFRESH_INTERVAL, the base every SNAPSHOT_FULL_INTERVAL.
+    SNAPSHOT_DIR: str = ""
+    SNAPSHOT_REFRESH_INTERVAL: float = 60.0
+    SNAPSHOT_FULL_INTERVAL: float = 3600.0
+    
+    # Seconds between rebuilds of the per-owner dashboard aggregates (0 disables)
+    OWNER_STATS_RECONCILE_INTERVAL: float = 3600.0
+    
+    # Idempotency-Key support: how long responses are replayed, and how long the
+    # lock held by a running request lasts; it is extended while the request
+    # runs, so this only bounds how long a crashed worker blocks its key
+    IDEMPOTENCY_TTL: int = 24 * 3600  # seconds
+    IDEMPOTENCY_LOCK_TTL: float = 10.0  # seconds
+    
+    # Bulk operations run one statement per this many short codes
+    BULK_CHUNK_SIZE: int = 1000
+    
+    # HTTP caching settings
+    REDIRECT_STATUS_CODE: Literal[301, 302, 307, 308] = 307  # 301 lets browsers and CDNs cache the redirect
+    REDIRECT_CACHE_MAX_AGE: int = 0  # seconds, capped by the link's expires_at
+    STATS_CACHE_MAX_AGE: int = 5
+    
+    # Analytics settings
+    UNIQUE_VISITORS_RETENTION_DAYS: int = 90
+    TRENDING_MAX_LINKS: int = 10000
     
     # Optional settings with defaults
     TESTING: bool = False
     
+    @field_validator("REDIRECT_STATUS_CODE", mode="before")
+    @classmethod
+    def parse_status_code(cls, value):
+        # Environment variables arrive as strings, which Literal[int, ...] rejects
+        return int(value) if isinstance(value, str) and value.strip().isdigit() else value
+    
     @property
     def SQLALCHEMY_DATABASE_URI(self) -> str:
         return f"postgresql://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}@{self.POSTGRES_SERVER}/{self.POSTGRES_DB}"
     
+    @property
+    def DATABASE_SHARD_LIST(self) -> List[str]:
+        return [url.strip() for url in self.DATABASE_SHARDS.split(",") if url.strip()]
+    
     @property
     def REDIS_URL(self) -> str:
         return f"redis://{self.REDIS_HOST}:{self.REDIS_PORT}/0"
 
+    @property
+    def REDIS_NODE_LIST(self) -> List[Tuple[str, int]]:
+        if not self.REDIS_NODES.strip():
+            return [(self.REDIS_HOST, self.REDIS_PORT)]
+        nodes = []
+        for node in self.REDIS_NODES.split(","):
+            host, _, port = node.strip().partition(":")
+            nodes.append((host, int(port) if port else 6379))
+        return nodes
+
     class Config:
         case_sensitive = True
         env_file = ".env"
@@ -0,0 +1,51 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+from starlette.requests import Request
+from starlette.routing import Match
+from .config import settings
+
+# Absolute time.monotonic() by which the current request must be done
+_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """The current request ran out of time."""
+
+
+@contextmanager
+def scope(seconds: Optional[float]) -> Iterator[None]:
+    """Give the code inside the block `seconds` to finish; None clears the deadline."""
+    token = _deadline.set(None if seconds is None else time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the deadline, or None when there is none."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def check() -> None:
+    """Raise DeadlineExceeded if the deadline has passed."""
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded()
+
+
+def route_key(request: Request) -> Optional[str]:
+    """Key of the route a request matches, as "METHOD /route/{template}"."""
+    for route in request.app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return f"{request.method} {getattr(route, 'path_format', route.path)}"
+    return None
+
+
+def for_request(request: Request) -> float:
+    """Deadline in seconds for the route a request matches."""
+    return settings.ROUTE_DEADLINES_MS.get(route_key(request), settings.REQUEST_DEADLINE_MS) / 1000
@@ -0,0 +1,61 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+from fastapi import Request
+
+
+def as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Treat naive datetimes (stored via utcnow) as UTC."""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def make_etag(*parts) -> str:
+    """Build a weak ETag from the values a representation depends on."""
+    digest = hashlib.sha1("|".join(str(part) for part in parts).encode()).hexdigest()
+    return f'W/"{digest[:20]}"'
+
+
+def last_modified(*values: Optional[datetime]) -> Optional[datetime]:
+    """Get the latest of several timestamps, truncated to whole seconds."""
+    present = [as_utc(value) for value in values if value is not None]
+    if not present:
+        return None
+    return max(present).replace(microsecond=0)
+
+
+def http_date(value: datetime) -> str:
+    return format_datetime(as_utc(value), usegmt=True)
+
+
+def is_not_modified(request: Request, etag: str, modified: Optional[datetime]) -> bool:
+    """Evaluate If-None-Match / If-Modified-Since against the current state."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        # Weak comparison: W/"x" matches "x"
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return etag.removeprefix("W/") in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and modified is not None:
+        try:
+            since = as_utc(parsedate_to_datetime(if_modified_since))
+        except (TypeError, ValueError):
+            return False
+        return modified <= since
+    return False
+
+
+def redirect_cache_control(max_age: int, expires_at: Optional[datetime], now: datetime) -> str:
+    """Cache-Control for a redirect; never lets caches outlive the link."""
+    if expires_at is not None:
+        max_age = min(max_age, int((as_utc(expires_at) - as_utc(now)).total_seconds()))
+    if max_age <= 0:
+        return "no-cache"
+    return f"public, max-age={max_age}"
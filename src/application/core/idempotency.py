@@ -0,0 +1,146 @@
+import hashlib
+import json
+import logging
+import threading
+import uuid
+from typing import Any, Callable, Optional
+import redis
+from fastapi import HTTPException, Response
+from fastapi.encoders import jsonable_encoder
+from .config import settings
+from ..db.cache import redis_client
+
+logger = logging.getLogger(__name__)
+
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+# KEYS: lock  ARGV: token. Deletes the lock only if this request still holds it.
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# KEYS: lock  ARGV: token, ttl (ms). Extends the lock only if this request still holds it.
+EXTEND_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+def fingerprint(*parts: Any) -> str:
+    """Hash what identifies a request, to detect a key reused for another one."""
+    return hashlib.sha256(json.dumps(jsonable_encoder(parts), sort_keys=True).encode()).hexdigest()
+
+def _release(lock_key: str, token: str) -> None:
+    try:
+        redis_client.register_script(RELEASE_SCRIPT)(keys=[lock_key], args=[token])
+    except redis.RedisError:
+        pass  # the lock expires on its own
+
+def _claim(result_key: str, lock_key: str, token: str) -> Optional[dict]:
+    """Return the stored response, or None once this request holds the lock.
+
+    The lock is taken and the response read in one MULTI/EXEC (both keys
+    live on the owner's node), so a response stored just before the lock
+    was freed is never missed. A duplicate arriving while the first request
+    runs gets 409 at once instead of holding a worker thread while it waits.
+    """
+    pipe = redis_client.pipeline(transaction=True)
+    pipe.set(lock_key, token, nx=True, px=int(settings.IDEMPOTENCY_LOCK_TTL * 1000))
+    pipe.get(result_key)
+    locked, stored = pipe.execute()
+    if stored is not None:
+        if locked:
+            _release(lock_key, token)
+        return json.loads(stored)
+    if not locked:
+        raise HTTPException(
+            status_code=409,
+            detail="A request with this Idempotency-Key is in progress",
+            headers={"Retry-After": "1"}
+        )
+    return None
+
+def _keep_locked(lock_key: str, token: str, done: threading.Event) -> None:
+    """Extend the lock every third of its TTL until `done` is set.
+
+    The lock thus lasts as long as the handler, however long that is, and
+    still expires soon after a worker that died while holding it.
+    """
+    ttl = settings.IDEMPOTENCY_LOCK_TTL
+    extend = redis_client.register_script(EXTEND_SCRIPT)
+    while not done.wait(ttl / 3):
+        try:
+            if not extend(keys=[lock_key], args=[token, int(ttl * 1000)]):
+                logger.warning("Lost idempotency lock %s while its request was running", lock_key)
+                return
+        except redis.RedisError:
+            pass  # try again on the next tick; the TTL leaves room for two misses
+
+def _store(result_key: str, request_fingerprint: str, status_code: int, body: Any) -> None:
+    try:
+        redis_client.setex(result_key, settings.IDEMPOTENCY_TTL, json.dumps({
+            "fingerprint": request_fingerprint,
+            "status_code": status_code,
+            "body": body
+        }))
+    except redis.RedisError:
+        logger.warning("Could not store idempotent response for %s", result_key)
+
+def _replay(stored: dict, request_fingerprint: str, response: Response) -> Any:
+    if stored["fingerprint"] != request_fingerprint:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+    if stored["status_code"] >= 400:
+        raise HTTPException(
+            status_code=stored["status_code"],
+            detail=stored["body"]["detail"],
+            headers={REPLAYED_HEADER: "true"}
+        )
+    response.headers[REPLAYED_HEADER] = "true"
+    return stored["body"]
+
+def execute(
+    owner_id: int,
+    key: Optional[str],
+    request_fingerprint: str,
+    response: Response,
+    handler: Callable[[], Any]
+) -> Any:
+    """Run `handler` at most once per owner and Idempotency-Key.
+
+    The response (or a 4xx error) is kept for IDEMPOTENCY_TTL and replayed to
+    retries straight from Redis, without calling the handler. Concurrent
+    duplicates get 409 while the first request holds the lock, which is kept
+    alive for as long as the handler runs. Without a key, or when Redis is
+    unreachable, the handler just runs.
+    """
+    if key is None:
+        return handler()
+    result_key = f"idem:{owner_id}:{key}"
+    lock_key = f"{result_key}:lock"
+    token = uuid.uuid4().hex
+    try:
+        stored = _claim(result_key, lock_key, token)
+    except redis.RedisError:
+        logger.warning("Idempotency store unavailable, running %s without it", result_key)
+        return handler()
+    if stored is not None:
+        return _replay(stored, request_fingerprint, response)
+
+    done = threading.Event()
+    threading.Thread(target=_keep_locked, args=(lock_key, token, done), daemon=True).start()
+    try:
+        body = handler()
+    except HTTPException as exc:
+        if exc.status_code < 500:
+            _store(result_key, request_fingerprint, exc.status_code, {"detail": exc.detail})
+        raise
+    else:
+        _store(result_key, request_fingerprint, response.status_code or 200, jsonable_encoder(body))
+        return body
+    finally:
+        done.set()
+        _release(lock_key, token)
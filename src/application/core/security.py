@@ -22,28 +22,32 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm="HS256")
     return encoded_jwt
 
-def get_current_user(
-    db: Session = Depends(get_db),
-    token: str = Depends(oauth2_scheme)
-) -> User:
-    """Get current user from JWT token."""
-    credentials_exception = HTTPException(
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    
+
+def get_current_user_id(token: str = Depends(oauth2_scheme)) -> int:
+    """Get the user id from a JWT token, without loading the user."""
     try:
         payload = jwt.decode(
             token, settings.SECRET_KEY, algorithms=["HS256"]
         )
         user_id: str = payload.get("sub")
         if user_id is None:
-            raise credentials_exception
+            raise _credentials_exception()
     except JWTError:
-        raise credentials_exception
-    
-    user = user_service.get_user_by_id(db, int(user_id))
+        raise _credentials_exception()
+    return int(user_id)
+
+def get_current_user(
+    db: Session = Depends(get_db),
+    user_id: int = Depends(get_current_user_id)
+) -> User:
+    """Get current user from JWT token."""
+    user = user_service.get_user_by_id(db, user_id)
     if user is None:
-        raise credentials_exception
+        raise _credentials_exception()
     return user 
\ No newline at end of file
@@ -0,0 +1,54 @@
+import asyncio
+import logging
+from typing import Callable
+from starlette.concurrency import run_in_threadpool
+from ..core.config import settings
+from ..db.session import LazySession, SessionLocal
+from ..db.snapshot import refresh_snapshot
+from ..services import url_service, owner_stats_service
+
+logger = logging.getLogger(__name__)
+
+async def run_periodically(interval: float, job: Callable[[], None]) -> None:
+    """Run a blocking job in the threadpool every `interval` seconds."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await run_in_threadpool(job)
+        except Exception:
+            logger.exception("Periodic job %s failed", job.__name__)
+
+def flush_clicks_job() -> None:
+    """Flush buffered clicks using a session of its own."""
+    db = LazySession(SessionLocal)
+    try:
+        url_service.flush_clicks(db)
+    finally:
+        db.close()
+
+def reconcile_owner_stats_job() -> None:
+    """Rebuild every owner's dashboard aggregates to correct drift."""
+    db = LazySession(SessionLocal)
+    try:
+        owners = owner_stats_service.reconcile_owner_stats(db)
+        logger.info("Reconciled dashboard stats for %d owners", owners)
+    finally:
+        db.close()
+
+def backfill_search_keys_job() -> None:
+    """Fill in search keys missing after a schema upgrade; runs once at startup."""
+    db = LazySession(SessionLocal)
+    try:
+        url_service.backfill_search_keys(db)
+    except Exception:
+        logger.exception("Search key backfill failed")
+    finally:
+        db.close()
+
+def refresh_snapshot_job() -> None:
+    """Refresh the redirect snapshot in SNAPSHOT_DIR."""
+    db = LazySession(SessionLocal)
+    try:
+        refresh_snapshot(db, settings.SNAPSHOT_DIR, settings.SNAPSHOT_FULL_INTERVAL)
+    finally:
+        db.close()
@@ -0,0 +1,386 @@
+import bisect
+import hashlib
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Sequence, Tuple
+import redis
+from ..core.config import settings
+from ..core.metrics import metrics
+from ..core import deadline
+
+logger = logging.getLogger(__name__)
+
+
+class CacheUnavailableError(redis.ConnectionError):
+    """Raised instead of calling a node whose circuit breaker is open."""
+
+
+@contextmanager
+def cache_fallback(action: str) -> Iterator[None]:
+    """Swallow cache errors so the caller can carry on without Redis."""
+    try:
+        yield
+    except redis.RedisError as exc:
+        metrics.incr("cache.fallbacks")
+        logger.debug("Cache %s failed, falling back: %s", action, exc)
+
+
+def routing_key(key: str) -> str:
+    """Return the part of a cache key that decides its node.
+
+    Keys are namespaced as ``<namespace>:<id>[:<suffix>]`` and are placed by
+    ``<id>``, so every key belonging to one link (``url:abc``, ``clicks:abc``)
+    lands on the same node and multi-key commands on them stay node-local.
+    """
+    parts = key.split(":", 2)
+    return parts[1] if len(parts) > 1 else key
+
+
+class HashRing:
+    """Consistent-hash ring with virtual nodes."""
+
+    def __init__(self, nodes: Iterable[str] = (), replicas: int = 160):
+        self.replicas = replicas
+        self._points: List[int] = []
+        self._owners: Dict[int, str] = {}
+        for node in nodes:
+            self.add_node(node)
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], "big")
+
+    @property
+    def nodes(self) -> List[str]:
+        return sorted(set(self._owners.values()))
+
+    def add_node(self, node: str) -> None:
+        """Add a node; only keys falling on its new points move to it."""
+        for i in range(self.replicas):
+            point = self._hash(f"{node}#{i}")
+            if point in self._owners:
+                continue
+            self._owners[point] = node
+            bisect.insort(self._points, point)
+
+    def remove_node(self, node: str) -> None:
+        """Remove a node; its keys move to the next points on the ring."""
+        for i in range(self.replicas):
+            point = self._hash(f"{node}#{i}")
+            if self._owners.get(point) == node:
+                del self._owners[point]
+                self._points.pop(bisect.bisect_left(self._points, point))
+
+    def get_node(self, key: str) -> str:
+        """Get the node owning a cache key."""
+        if not self._points:
+            raise ValueError("Hash ring has no nodes")
+        index = bisect.bisect(self._points, self._hash(routing_key(key)))
+        return self._owners[self._points[index % len(self._points)]]
+
+
+class CircuitBreaker:
+    """Closed -> open after consecutive failures -> half-open after a cool-down.
+
+    While open, calls fail immediately with CacheUnavailableError. Once the
+    cool-down passes, a single probe call is let through: success closes the
+    breaker, failure opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        reset_timeout: float = 5.0,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+    def _transition(self, state: str) -> None:
+        if state == self.state:
+            return
+        logger.warning("Cache node %s circuit %s -> %s", self.name, self.state, state)
+        metrics.incr(f"cache.breaker.{self.name}.{state}")
+        metrics.set_gauge(f"cache.breaker.{self.name}.open", int(state != self.CLOSED))
+        self.state = state
+
+    def before_call(self) -> None:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            if self.state == self.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+                self._transition(self.HALF_OPEN)
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return
+        metrics.incr("cache.breaker.rejected")
+        raise CacheUnavailableError(f"Circuit open for cache node {self.name}")
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._probing = False
+            self._transition(self.CLOSED)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._opened_at = self._clock()
+                self._transition(self.OPEN)
+
+    def release_probe(self) -> None:
+        with self._lock:
+            self._probing = False
+
+    def call(self, func: Callable, *args, **kwargs):
+        self.before_call()
+        try:
+            result = func(*args, **kwargs)
+        except (redis.ConnectionError, redis.TimeoutError):
+            self.record_failure()
+            raise
+        except redis.RedisError:
+            # Command errors (WRONGTYPE, NOSCRIPT, ...) prove the node is up
+            self.record_success()
+            raise
+        except BaseException:
+            # Says nothing about the node; keep the state, free the probe slot
+            self.release_probe()
+            raise
+        self.record_success()
+        return result
+
+
+class _GuardedPipeline:
+    def __init__(self, pipe, breaker: CircuitBreaker):
+        self._pipe = pipe
+        self._breaker = breaker
+
+    def __getattr__(self, name: str):
+        return getattr(self._pipe, name)
+
+    def execute(self) -> list:
+        deadline.check()
+        return self._breaker.call(self._pipe.execute)
+
+
+class GuardedClient:
+    """Redis client proxy that routes every network call through a breaker.
+
+    Calls are refused once the request deadline has passed.
+    """
+
+    def __init__(self, client: redis.Redis, breaker: CircuitBreaker):
+        self.client = client
+        self.breaker = breaker
+
+    def __getattr__(self, name: str):
+        attr = getattr(self.client, name)
+        if not callable(attr):
+            return attr
+
+        def guarded(*args, **kwargs):
+            deadline.check()
+            return self.breaker.call(attr, *args, **kwargs)
+
+        return guarded
+
+    def pipeline(self, transaction: bool = True) -> _GuardedPipeline:
+        return _GuardedPipeline(self.client.pipeline(transaction=transaction), self.breaker)
+
+    def register_script(self, script: str) -> redis.commands.core.Script:
+        return self.client.register_script(script)
+
+
+class ShardedPipeline:
+    """Pipeline that buffers commands and sends one pipeline per node."""
+
+    def __init__(self, sharded: "ShardedRedis", transaction: bool = False):
+        self._sharded = sharded
+        self._transaction = transaction
+        self._commands: List[Tuple[str, str, tuple, dict]] = []
+
+    def __getattr__(self, name: str):
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        def queue(key: str, *args, **kwargs) -> "ShardedPipeline":
+            self._commands.append((name, key, args, kwargs))
+            return self
+
+        return queue
+
+    def __enter__(self) -> "ShardedPipeline":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._commands = []
+
+    def __len__(self) -> int:
+        return len(self._commands)
+
+    def execute(self) -> list:
+        """Run buffered commands, grouped per node, and return results in order."""
+        commands, self._commands = self._commands, []
+        results: list = [None] * len(commands)
+        pipes: Dict[str, Tuple[redis.client.Pipeline, List[int]]] = {}
+        for i, (name, key, args, kwargs) in enumerate(commands):
+            node = self._sharded.ring.get_node(key)
+            if node not in pipes:
+                client = self._sharded.clients[node]
+                pipes[node] = (client.pipeline(transaction=self._transaction), [])
+            pipe, indices = pipes[node]
+            getattr(pipe, name)(key, *args, **kwargs)
+            indices.append(i)
+        for pipe, indices in pipes.values():
+            for i, result in zip(indices, pipe.execute()):
+                results[i] = result
+        return results
+
+
+class ShardedScript:
+    """Lua script run on the node that owns its first key.
+
+    Every key a script touches must route to the same node; see routing_key.
+    """
+
+    def __init__(self, sharded: "ShardedRedis", script: str):
+        self._sharded = sharded
+        self.script = script
+        self._scripts: Dict[str, redis.commands.core.Script] = {}
+
+    def __call__(self, keys: Sequence[str], args: Sequence = ()):
+        node = self._sharded.ring.get_node(keys[0])
+        client = self._sharded.clients[node]
+        script = self._scripts.get(node)
+        if script is None:
+            script = self._scripts[node] = client.register_script(self.script)
+        # Run through the (possibly guarded) client rather than the raw one
+        return script(keys=keys, args=args, client=client)
+
+
+class ShardedRedis:
+    """Redis client that spreads keys over several nodes with a hash ring.
+
+    Single-key commands are forwarded to the owning node as-is; multi-key
+    commands and pipelines are split into one call per node.
+    """
+
+    def __init__(
+        self,
+        clients: Dict[str, redis.Redis],
+        replicas: int = 160,
+        breaker_factory: Callable[[str], CircuitBreaker] = None
+    ):
+        self.breaker_factory = breaker_factory
+        self.clients: Dict[str, redis.Redis] = {}
+        self.ring = HashRing(replicas=replicas)
+        self._scripts: Dict[str, ShardedScript] = {}
+        for name, client in clients.items():
+            self.add_node(name, client)
+
+    @classmethod
+    def from_nodes(cls, nodes: Sequence[Tuple[str, int]], **kwargs) -> "ShardedRedis":
+        return cls(
+            {
+                f"{host}:{port}": redis.Redis(
+                    host=host,
+                    port=port,
+                    socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+                    socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT,
+                    **kwargs
+                )
+                for host, port in nodes
+            },
+            breaker_factory=lambda name: CircuitBreaker(
+                name,
+                failure_threshold=settings.CACHE_BREAKER_FAILURE_THRESHOLD,
+                reset_timeout=settings.CACHE_BREAKER_RESET_TIMEOUT
+            )
+        )
+
+    def add_node(self, name: str, client: redis.Redis) -> None:
+        if self.breaker_factory is not None:
+            client = GuardedClient(client, self.breaker_factory(name))
+        self.clients[name] = client
+        self.ring.add_node(name)
+        self._scripts.clear()
+
+    def remove_node(self, name: str) -> None:
+        self.ring.remove_node(name)
+        self.clients.pop(name, None)
+        self._scripts.clear()
+
+    def get_client(self, key: str) -> redis.Redis:
+        """Get the client for the node owning a key."""
+        return self.clients[self.ring.get_node(key)]
+
+    def group_keys(self, keys: Iterable[str]) -> Dict[str, List[int]]:
+        """Map each node to the positions of the keys it owns."""
+        groups: Dict[str, List[int]] = {}
+        for i, key in enumerate(keys):
+            groups.setdefault(self.ring.get_node(key), []).append(i)
+        return groups
+
+    def __getattr__(self, name: str):
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        def command(key: str, *args, **kwargs):
+            return getattr(self.get_client(key), name)(key, *args, **kwargs)
+
+        return command
+
+    def register_script(self, script: str) -> ShardedScript:
+        """Get the (memoized) sharded wrapper for a Lua script."""
+        if script not in self._scripts:
+            self._scripts[script] = ShardedScript(self, script)
+        return self._scripts[script]
+
+    def pipeline(self, transaction: bool = False) -> ShardedPipeline:
+        return ShardedPipeline(self, transaction=transaction)
+
+    def mget(self, keys: Sequence[str]) -> list:
+        """Get several keys with one MGET per node."""
+        keys = list(keys)
+        values: list = [None] * len(keys)
+        for node, indices in self.group_keys(keys).items():
+            found = self.clients[node].mget([keys[i] for i in indices])
+            for i, value in zip(indices, found):
+                values[i] = value
+        return values
+
+    def _per_node(self, command: str, keys: Sequence[str]) -> int:
+        keys = list(keys)
+        total = 0
+        for node, indices in self.group_keys(keys).items():
+            total += getattr(self.clients[node], command)(*[keys[i] for i in indices])
+        return total
+
+    def delete(self, *keys: str) -> int:
+        return self._per_node("delete", keys)
+
+    def unlink(self, *keys: str) -> int:
+        return self._per_node("unlink", keys)
+
+    def exists(self, *keys: str) -> int:
+        return self._per_node("exists", keys)
+
+
+redis_client = ShardedRedis.from_nodes(settings.REDIS_NODE_LIST, decode_responses=True)
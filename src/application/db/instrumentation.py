@@ -0,0 +1,115 @@
+import logging
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, List, Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_SETUP_PREFIX = re.compile(r"^(?:SET LOCAL [^;]*;\s*)+")
+
+
+class QueryStats:
+    """Number and total duration of the SQL statements run in a scope."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements: List[str] = []
+
+    def record(self, statement: str, duration: float) -> None:
+        self.count += 1
+        self.duration += duration
+        self.statements.append(statement)
+
+
+_request_stats: ContextVar[Optional[QueryStats]] = ContextVar("request_query_stats", default=None)
+# Captures that see every statement regardless of context, for tests whose
+# client runs the app in another thread
+_captures: List[QueryStats] = []
+
+
+@contextmanager
+def track_queries() -> Iterator[QueryStats]:
+    """Collect the statements run in the current context (e.g. one request)."""
+    stats = QueryStats()
+    token = _request_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _request_stats.reset(token)
+
+
+@contextmanager
+def assert_max_queries(limit: int) -> Iterator[QueryStats]:
+    """Fail if more than `limit` statements run inside the block."""
+    stats = QueryStats()
+    _captures.append(stats)
+    try:
+        yield stats
+    finally:
+        _captures.remove(stats)
+    if stats.count > limit:
+        raise AssertionError(
+            f"Expected at most {limit} queries, got {stats.count}:\n" + "\n".join(stats.statements)
+        )
+
+
+def _explain(conn, statement: str, parameters) -> str:
+    """Get the plan of a statement on the same connection, inside a savepoint
+    so a failing EXPLAIN cannot abort the caller's transaction."""
+    prefix = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN "
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute("SAVEPOINT explain_slow_query")
+        try:
+            cursor.execute(prefix + statement, parameters)
+            rows = cursor.fetchall()
+        finally:
+            cursor.execute("ROLLBACK TO SAVEPOINT explain_slow_query")
+            cursor.execute("RELEASE SAVEPOINT explain_slow_query")
+    finally:
+        cursor.close()
+    return "\n".join(" ".join(str(column) for column in row) for row in rows)
+
+
+# The start time lives on the execution context, not the connection, so a
+# statement that fails (and never reaches after_cursor_execute) leaves
+# nothing behind on the pooled connection.
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context.query_started_at = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started_at = getattr(context, "query_started_at", None)
+    if started_at is None:
+        return
+    duration = time.perf_counter() - started_at
+    # Drop the deadline timeouts sent along with a transaction's first statement
+    statement = _SETUP_PREFIX.sub("", statement)
+
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.record(statement, duration)
+    for capture in _captures:
+        capture.record(statement, duration)
+
+    if duration * 1000 < settings.SLOW_QUERY_THRESHOLD_MS:
+        return
+    plan = ""
+    if not executemany and statement.lstrip()[:6].upper() == "SELECT":
+        try:
+            plan = _explain(conn, statement, parameters)
+        except Exception:
+            logger.debug("Could not explain slow query", exc_info=True)
+    logger.warning(
+        "Slow query (%.1f ms): %s\nParameters: %r\nPlan:\n%s",
+        duration * 1000, statement, parameters, plan or "unavailable"
+    )
@@ -0,0 +1,42 @@
+import logging
+from typing import Iterable, List, Optional
+from sqlalchemy import Table, inspect
+from sqlalchemy.engine import Engine
+from sqlalchemy.schema import CreateColumn
+from .base_class import Base
+
+logger = logging.getLogger(__name__)
+
+
+def upgrade_schema(engine: Engine, tables: Optional[Iterable[Table]] = None) -> List[str]:
+    """Add the columns and indexes that models gained after their tables were created.
+
+    create_all only creates missing tables, so this runs after it at startup.
+    Added columns must be nullable or have a server default; rows written
+    before the upgrade keep NULL there (url_service.backfill_search_keys
+    fills in urls.search_key at startup). Returns what was added.
+    """
+    inspector = inspect(engine)
+    added = []
+    with engine.begin() as conn:
+        preparer = conn.dialect.identifier_preparer
+        for table in Base.metadata.sorted_tables if tables is None else tables:
+            if not inspector.has_table(table.name):
+                continue
+            columns = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in columns:
+                    continue
+                if not column.nullable and column.server_default is None:
+                    raise RuntimeError(f"Cannot add required column {table.name}.{column.name} to an existing table")
+                definition = CreateColumn(column).compile(dialect=conn.dialect)
+                conn.exec_driver_sql(f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {definition}")
+                added.append(f"{table.name}.{column.name}")
+            indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in indexes:
+                    index.create(conn)
+                    added.append(index.name)
+    if added:
+        logger.warning("Upgraded database schema: added %s", ", ".join(added))
+    return added
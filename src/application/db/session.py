@@ -1,12 +1,93 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from typing import Callable, Optional
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import Pool
 from ..core.config import settings
+from ..core.metrics import metrics
+from ..core import deadline
 
-engine = create_engine(settings.SQLALCHEMY_DATABASE_URI, pool_pre_ping=True)
+engine = create_engine(
+    settings.SQLALCHEMY_DATABASE_URI,
+    pool_pre_ping=True,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+@event.listens_for(Pool, "checkout")
+def _count_checkout(dbapi_connection, connection_record, connection_proxy):
+    metrics.incr("db.pool.checkouts")
+
+@event.listens_for(Pool, "checkin")
+def _count_checkin(dbapi_connection, connection_record):
+    metrics.incr("db.pool.checkins")
+    # Timeouts of a transaction that never ran a statement must not leak
+    connection_record.info.pop(TIMEOUTS_KEY, None)
+
+# Connection.info key holding the SET LOCAL prefix for a transaction's first statement
+TIMEOUTS_KEY = "deadline_timeouts"
+
+@event.listens_for(Session, "after_begin")
+def _apply_deadline(session, transaction, connection):
+    """Bound each transaction's statements and lock waits by the time the
+    request has left, so a slow query cannot outlive its request.
+
+    On Postgres the timeouts are sent in front of the transaction's first
+    statement (see _send_timeouts), so they cost no extra round trip.
+    """
+    connection.info.pop(TIMEOUTS_KEY, None)
+    left = deadline.remaining()
+    if left is None:
+        return
+    if left <= 0:
+        raise deadline.DeadlineExceeded()
+    if connection.dialect.name != "postgresql":
+        return
+    ms = max(int(left * 1000), 1)
+    connection.info[TIMEOUTS_KEY] = f"SET LOCAL statement_timeout = {ms}; SET LOCAL lock_timeout = {ms}; "
+
+@event.listens_for(Engine, "before_cursor_execute", retval=True)
+def _send_timeouts(conn, cursor, statement, parameters, context, executemany):
+    prefix = conn.info.pop(TIMEOUTS_KEY, None)
+    if prefix is None:
+        return statement, parameters
+    if executemany or getattr(cursor, "name", None):
+        # Batched or server-side cursor statements cannot carry a prefix
+        setup = cursor.connection.cursor()
+        try:
+            setup.execute(prefix)
+        finally:
+            setup.close()
+        return statement, parameters
+    return prefix + statement, parameters
+
+class LazySession:
+    """Stands in for a Session and only creates it on first use.
+
+    Requests answered from the cache never touch the session, so they skip
+    building it and never check out a pooled connection.
+    """
+
+    def __init__(self, factory: Callable[[], Session]):
+        self._factory = factory
+        self._session: Optional[Session] = None
+
+    def __getattr__(self, name: str):
+        if self._session is None:
+            self._session = self._factory()
+            metrics.incr("db.sessions")
+        return getattr(self._session, name)
+
+    def close(self) -> None:
+        if self._session is not None:
+            # Sessions opened on other link shards for this one (see ShardRouter.session)
+            for shard_session in self._session.info.pop("shard_sessions", {}).values():
+                shard_session.close()
+            self._session.close()
+
 def get_db():
-    db = SessionLocal()
+    db = LazySession(SessionLocal)
     try:
         yield db
     finally:
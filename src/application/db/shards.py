@@ -0,0 +1,136 @@
+import string
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from typing import Callable, Dict, Iterable, List, Optional, TypeVar
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.schema import CreateIndex, CreateTable
+from ..core.config import settings
+from ..models.models import URL
+from .schema import upgrade_schema
+from .session import SessionLocal
+
+T = TypeVar("T")
+
+CODE_ALPHABET = string.ascii_letters + string.digits
+
+
+class ShardRouter:
+    """Spreads links over several databases by short code.
+
+    Shard 0 is the main database, which also holds users. The first character
+    of a short code decides its shard, so any code maps to its database
+    without a directory lookup. Generated codes start with a character of the
+    owner's home shard, which keeps an owner's generated links together.
+    Custom aliases land wherever their first character points, so owner-wide
+    queries still visit every shard, in parallel.
+
+    The number of shards decides where existing codes live, so it cannot
+    change once links are stored.
+    """
+
+    def __init__(self, factories: List[sessionmaker]):
+        self.factories = factories
+        self._executor = ThreadPoolExecutor(max_workers=4 * len(factories)) if len(factories) > 1 else None
+
+    @classmethod
+    def from_settings(cls) -> "ShardRouter":
+        factories = [SessionLocal]
+        for url in settings.DATABASE_SHARD_LIST:
+            engine = create_engine(
+                url,
+                pool_pre_ping=True,
+                pool_size=settings.DB_POOL_SIZE,
+                max_overflow=settings.DB_MAX_OVERFLOW
+            )
+            factories.append(sessionmaker(autocommit=False, autoflush=False, bind=engine))
+        return cls(factories)
+
+    @property
+    def count(self) -> int:
+        return len(self.factories)
+
+    @property
+    def engines(self) -> List[Engine]:
+        return [factory.kw["bind"] for factory in self.factories]
+
+    def shard_for_code(self, short_code: str) -> int:
+        index = CODE_ALPHABET.find(short_code[:1])
+        if index < 0:
+            return zlib.crc32(short_code.encode()) % self.count
+        return index % self.count
+
+    def home_shard(self, owner_id: Optional[int], original_url: str) -> int:
+        """Shard for a new generated link; anonymous links are placed by target
+        so that shortening the same URL twice finds the first link."""
+        if owner_id is None:
+            return zlib.crc32(original_url.encode()) % self.count
+        return owner_id % self.count
+
+    def first_chars(self, shard: int) -> str:
+        """Code characters that route to a shard."""
+        return CODE_ALPHABET[shard::self.count]
+
+    def group_by_shard(self, short_codes: Iterable[str]) -> Dict[int, List[str]]:
+        groups: Dict[int, List[str]] = {}
+        for short_code in short_codes:
+            groups.setdefault(self.shard_for_code(short_code), []).append(short_code)
+        return groups
+
+    def session(self, db: Session, shard: int) -> Session:
+        """The session for a shard that belongs with `db`; shard 0 is `db` itself.
+
+        Other shards' sessions are created on first use and kept in db.info,
+        and are closed together with `db` (see LazySession.close).
+        """
+        if shard == 0:
+            return db
+        sessions = db.info.setdefault("shard_sessions", {})
+        if shard not in sessions:
+            sessions[shard] = self.factories[shard]()
+        return sessions[shard]
+
+    def for_code(self, db: Session, short_code: str) -> Session:
+        return self.session(db, self.shard_for_code(short_code))
+
+    def scatter(
+        self,
+        db: Session,
+        func: Callable[[Session, int], T],
+        shards: Optional[Iterable[int]] = None
+    ) -> List[T]:
+        """Call func(session, shard) for every shard (or the given ones) in
+        parallel and return the results in shard order."""
+        shards = list(range(self.count)) if shards is None else list(shards)
+        sessions = [self.session(db, shard) for shard in shards]
+        if len(shards) == 1:
+            return [func(sessions[0], shards[0])]
+        # Each call runs in a copy of this context, so deadlines and query
+        # tracking follow it into the pool
+        futures = [
+            self._executor.submit(copy_context().run, func, session, shard)
+            for session, shard in zip(sessions, shards)
+        ]
+        return [future.result() for future in futures]
+
+
+def create_link_tables(engine: Engine) -> None:
+    """Create (or upgrade) the urls table on a link shard.
+
+    Users only live on shard 0, so the owner foreign key is left out.
+    """
+    table = URL.__table__
+    with engine.begin() as conn:
+        exists = engine.dialect.has_table(conn, table.name)
+    if exists:
+        upgrade_schema(engine, [table])
+        return
+    with engine.begin() as conn:
+        conn.execute(CreateTable(table, include_foreign_key_constraints=[]))
+        for index in table.indexes:
+            conn.execute(CreateIndex(index))
+
+
+shard_router = ShardRouter.from_settings()
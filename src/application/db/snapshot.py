@@ -0,0 +1,224 @@
+import fcntl
+import heapq
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterable, Optional, Tuple
+from sqlalchemy import func, or_, select
+from sqlalchemy.orm import Session
+from ..models.models import URL
+from ..models.records import RedirectTarget
+from .shards import shard_router
+
+logger = logging.getLogger(__name__)
+
+# File layout (little endian):
+#   header  magic, entry count, index offset, build time
+#   data    per link: short code bytes, then target URL bytes
+#   index   per link, sorted by short code bytes: offset of the code, code
+#           length, URL length (the URL follows the code), expiry timestamp
+#           (0 = never)
+# Fixed-size index entries allow a binary search straight over the mmap.
+MAGIC = b"URLSNAP1"
+HEADER = struct.Struct("<8sIQd")
+ENTRY = struct.Struct("<QHIq")
+
+BASE_NAME = "redirects.snap"
+DELTA_NAME = "redirects.delta.snap"
+LOCK_NAME = "redirects.lock"
+
+
+def _timestamp(value: Optional[datetime]) -> int:
+    if value is None:
+        return 0
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp())
+
+
+def write_snapshot(path: Path, rows: Iterable[Tuple[str, str, Optional[datetime]]], built_at: float) -> int:
+    """Write (short_code, original_url, expires_at) rows, sorted by code, to `path`.
+
+    The file is written next to its destination and renamed into place, so
+    readers never see a partial snapshot. Returns the number of entries.
+    """
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    index = bytearray()
+    count = 0
+    previous = None
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, 0, 0, built_at))
+        for short_code, original_url, expires_at in rows:
+            key, value = short_code.encode(), original_url.encode()
+            if previous is not None and key <= previous:
+                raise ValueError("Snapshot rows must be sorted by short code bytes")
+            index += ENTRY.pack(f.tell(), len(key), len(value), _timestamp(expires_at))
+            f.write(key)
+            f.write(value)
+            previous = key
+            count += 1
+        index_offset = f.tell()
+        f.write(index)
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, count, index_offset, built_at))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return count
+
+
+class SnapshotFile:
+    """Read-only, memory-mapped snapshot; pages are shared between processes."""
+
+    def __init__(self, path: Path):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, self._index, self.built_at = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a redirect snapshot")
+
+    def _key(self, i: int) -> Tuple[bytes, int, int, int]:
+        offset, key_len, value_len, expires_ts = ENTRY.unpack_from(self._mm, self._index + i * ENTRY.size)
+        return self._mm[offset:offset + key_len], offset + key_len, value_len, expires_ts
+
+    def get(self, short_code: str) -> Optional[RedirectTarget]:
+        key = short_code.encode()
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            found, value_offset, value_len, expires_ts = self._key(mid)
+            if found < key:
+                lo = mid + 1
+            elif found > key:
+                hi = mid
+            else:
+                return RedirectTarget(
+                    self._mm[value_offset:value_offset + value_len].decode(),
+                    datetime.utcfromtimestamp(expires_ts) if expires_ts else None
+                )
+        return None
+
+
+def _sorted_by_code(db: Session):
+    # Binary search needs byte order, which Postgres gives under the C collation
+    if db.get_bind().dialect.name == "postgresql":
+        return URL.short_code.collate("C")
+    return URL.short_code
+
+
+def _sorted_rows(db: Session, query, **options):
+    """Rows of `query` from every link shard, merged in short code order."""
+    streams = []
+    for shard in range(shard_router.count):
+        session = shard_router.session(db, shard)
+        streams.append(session.execute(query.order_by(_sorted_by_code(session)).execution_options(**options)))
+    return heapq.merge(*streams, key=lambda row: row[0])
+
+
+def _try_lock(directory: Path):
+    """Non-blocking lock so only one worker process builds at a time."""
+    f = open(directory / LOCK_NAME, "w")
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        f.close()
+        return None
+    return f
+
+
+def refresh_snapshot(db: Session, directory: str, full_interval: float) -> Optional[str]:
+    """Rebuild the base snapshot when it is older than `full_interval`,
+    otherwise rewrite the delta with every link changed since the base.
+
+    Links deleted since the last full build stay in the snapshot until the
+    next one. Returns "full", "delta", or None if another process is building.
+    """
+    path = Path(directory)
+    path.mkdir(parents=True, exist_ok=True)
+    lock = _try_lock(path)
+    if lock is None:
+        return None
+    try:
+        base_path = path / BASE_NAME
+        now = time.time()
+        base_built_at = None
+        if base_path.exists():
+            try:
+                base_built_at = SnapshotFile(base_path).built_at
+            except (OSError, ValueError, struct.error):
+                logger.warning("Replacing unreadable snapshot %s", base_path)
+        columns = (URL.short_code, URL.original_url, URL.expires_at)
+
+        if base_built_at is None or now - base_built_at >= full_interval:
+            cutoff = datetime.utcfromtimestamp(now)
+            query = select(*columns).where(or_(URL.expires_at.is_(None), URL.expires_at > cutoff))
+            rows = _sorted_rows(db, query, yield_per=10000)
+            count = write_snapshot(base_path, rows, now)
+            (path / DELTA_NAME).unlink(missing_ok=True)
+            logger.info("Built redirect snapshot with %d links", count)
+            return "full"
+
+        since = datetime.utcfromtimestamp(base_built_at - 60)  # margin for clock skew and slow commits
+        changed = func.coalesce(URL.updated_at, URL.created_at) >= since
+        rows = _sorted_rows(db, select(*columns).where(changed))
+        count = write_snapshot(path / DELTA_NAME, rows, now)
+        logger.debug("Built redirect snapshot delta with %d links", count)
+        return "delta"
+    finally:
+        lock.close()
+
+
+class RedirectSnapshot:
+    """Looks links up in the delta, then the base snapshot of a directory.
+
+    Files are reopened when they are replaced, checked at most every
+    `check_interval` seconds. Lookups take a few microseconds.
+    """
+
+    def __init__(self, directory: str, check_interval: float = 1.0):
+        self.directory = Path(directory) if directory else None
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+        self._stamps = {}
+        self._files = {}
+
+    def _reload(self) -> None:
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            self._checked_at = now
+            for name in (DELTA_NAME, BASE_NAME):
+                try:
+                    stat = os.stat(self.directory / name)
+                except FileNotFoundError:
+                    self._files.pop(name, None)
+                    self._stamps.pop(name, None)
+                    continue
+                stamp = (stat.st_ino, stat.st_mtime_ns)
+                if self._stamps.get(name) == stamp:
+                    continue
+                try:
+                    self._files[name] = SnapshotFile(self.directory / name)
+                    self._stamps[name] = stamp
+                except (OSError, ValueError, struct.error):
+                    logger.warning("Could not open redirect snapshot %s", name, exc_info=True)
+
+    def lookup(self, short_code: str) -> Optional[RedirectTarget]:
+        if self.directory is None:
+            return None
+        self._reload()
+        files = self._files
+        for name in (DELTA_NAME, BASE_NAME):
+            snapshot = files.get(name)
+            if snapshot is not None:
+                target = snapshot.get(short_code)
+                if target is not None:
+                    return target
+        return None
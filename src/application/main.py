@@ -1,13 +1,31 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.exc import OperationalError
 from .api.api import api_router
 from .core.config import settings
 from .db.base_class import Base
 from .db.session import engine
+from .db.schema import upgrade_schema
+from .db.shards import create_link_tables, shard_router
+from .db.instrumentation import track_queries
+from .core.tasks import (
+    run_periodically, backfill_search_keys_job, flush_clicks_job, reconcile_owner_stats_job, refresh_snapshot_job
+)
+from .core.metrics import metrics
+from .core import admission, deadline
+import asyncio
+import logging
 import os
 
+logger = logging.getLogger(__name__)
+
 if not os.getenv("TESTING"):
     Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine)
+    for shard_engine in shard_router.engines[1:]:
+        create_link_tables(shard_engine)
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -26,6 +44,99 @@ app.add_middleware(
 
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
+@app.middleware("http")
+async def track_request_queries(request: Request, call_next):
+    """Count and time the SQL statements each request runs."""
+    with track_queries() as stats:
+        response = await call_next(request)
+    response.headers["X-DB-Queries"] = str(stats.count)
+    response.headers["X-DB-Time"] = f"{stats.duration * 1000:.1f}ms"
+    if stats.count > settings.REQUEST_QUERY_BUDGET:
+        logger.warning(
+            "%s %s ran %d queries (budget %d)",
+            request.method, request.url.path, stats.count, settings.REQUEST_QUERY_BUDGET
+        )
+    return response
+
+@app.middleware("http")
+async def enforce_deadline(request: Request, call_next):
+    """Give each request its route's deadline and answer 504 once it passes.
+
+    Work already running in the threadpool is not interrupted, but every later
+    database transaction and cache call fails fast, and the transaction's
+    statement/lock timeouts end queries that are still running.
+    """
+    seconds = deadline.for_request(request)
+    with deadline.scope(seconds):
+        task = asyncio.ensure_future(call_next(request))
+        done, _ = await asyncio.wait({task}, timeout=seconds)
+    if task in done:
+        return task.result()
+    task.cancel()
+    metrics.incr("requests.deadline_exceeded")
+    logger.warning("%s %s exceeded its %.0f ms deadline", request.method, request.url.path, seconds * 1000)
+    return JSONResponse(status_code=504, content={"detail": "Request deadline exceeded"})
+
+@app.middleware("http")
+async def shed_load(request: Request, call_next):
+    """Turn requests away with 503 while the worker threads are backed up,
+    lowest priority first, so redirects keep their latency under overload."""
+    controller = admission.admission_controller
+    if not controller.try_admit(admission.priority_for(request), admission.free_threads()):
+        return JSONResponse(
+            status_code=503,
+            content={"detail": "Server is overloaded, try again later"},
+            headers={"Retry-After": "1"}
+        )
+    try:
+        return await call_next(request)
+    finally:
+        controller.release()
+
+@app.exception_handler(deadline.DeadlineExceeded)
+async def deadline_exceeded_handler(request: Request, exc: deadline.DeadlineExceeded):
+    metrics.incr("requests.deadline_exceeded")
+    return JSONResponse(status_code=504, content={"detail": "Request deadline exceeded"})
+
+# query_canceled (statement_timeout) and lock_not_available (lock_timeout)
+TIMEOUT_PGCODES = {"57014", "55P03"}
+
+@app.exception_handler(OperationalError)
+async def database_timeout_handler(request: Request, exc: OperationalError):
+    if getattr(exc.orig, "pgcode", None) not in TIMEOUT_PGCODES:
+        raise exc
+    metrics.incr("requests.database_timeout")
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Database timed out"},
+        headers={"Retry-After": "1"}
+    )
+
+@app.on_event("startup")
+async def start_background_jobs():
+    admission.set_threadpool_size(settings.THREADPOOL_SIZE)
+    if settings.TESTING:
+        return
+    jobs = app.state.background_jobs = []
+    jobs.append(asyncio.create_task(run_in_threadpool(backfill_search_keys_job)))
+    if settings.ADMISSION_PROBE_INTERVAL > 0:
+        jobs.append(asyncio.create_task(
+            admission.probe_queue_wait(admission.admission_controller, settings.ADMISSION_PROBE_INTERVAL)
+        ))
+    if settings.CLICK_FLUSH_INTERVAL > 0:
+        jobs.append(asyncio.create_task(run_periodically(settings.CLICK_FLUSH_INTERVAL, flush_clicks_job)))
+    if settings.SNAPSHOT_DIR:
+        jobs.append(asyncio.create_task(run_periodically(settings.SNAPSHOT_REFRESH_INTERVAL, refresh_snapshot_job)))
+    if settings.OWNER_STATS_RECONCILE_INTERVAL > 0:
+        jobs.append(asyncio.create_task(
+            run_periodically(settings.OWNER_STATS_RECONCILE_INTERVAL, reconcile_owner_stats_job)
+        ))
+
+@app.on_event("shutdown")
+async def stop_background_jobs():
+    for job in getattr(app.state, "background_jobs", []):
+        job.cancel()
+
 @app.get("/")
 async def root():
     return {
@@ -33,4 +144,9 @@ async def root():
         "version": settings.VERSION,
         "docs_url": "/docs",
         "redoc_url": "/redoc"
-    } 
\ No newline at end of file
+    }
+
+@app.get("/metrics")
+async def get_metrics():
+    """Process counters and gauges (e.g. cache circuit breaker state changes)."""
+    return metrics.snapshot()
@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, DateTime, BigInteger
+from sqlalchemy import Boolean, Column, ForeignKey, Index, Integer, String, DateTime, BigInteger
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from ..db.base_class import Base
@@ -20,13 +20,21 @@ class URL(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     original_url = Column(String, index=True)
+    # Reversed host plus path ("com.example.www/blog?id=1") for domain and
+    # prefix search; compared bytewise so prefixes map to index ranges
+    search_key = Column(String().with_variant(String(collation="C"), "postgresql"), nullable=True)
     short_code = Column(String, unique=True, index=True)
     custom_alias = Column(String, unique=True, index=True, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), nullable=True)
     expires_at = Column(DateTime(timezone=True), nullable=True)
     last_accessed_at = Column(DateTime(timezone=True), nullable=True)
     access_count = Column(BigInteger, default=0)
     
     owner_id = Column(Integer, ForeignKey("users.id"), nullable=True)
     
-    owner = relationship("User", back_populates="urls") 
\ No newline at end of file
+    owner = relationship("User", back_populates="urls")
+
+    __table_args__ = (
+        Index("ix_urls_owner_search_key", "owner_id", "search_key", "short_code"),
+    ) 
\ No newline at end of file
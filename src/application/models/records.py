@@ -0,0 +1,47 @@
+from datetime import datetime
+from typing import NamedTuple, Optional
+from .models import URL
+
+
+class URLRecord(NamedTuple):
+    """Immutable, ORM-free view of a URL row for read paths.
+
+    Built straight from the cache payload or a projection query, so reads skip
+    SQLAlchemy instance construction and attribute tracking. Writes still go
+    through the URL model.
+    """
+    id: int
+    original_url: str
+    short_code: str
+    custom_alias: Optional[str]
+    created_at: datetime
+    updated_at: Optional[datetime]
+    expires_at: Optional[datetime]
+    last_accessed_at: Optional[datetime]
+    access_count: int
+    owner_id: Optional[int]
+
+    @classmethod
+    def from_cache(cls, data: dict) -> "URLRecord":
+        return cls(
+            id=data["id"],
+            original_url=data["original_url"],
+            short_code=data["short_code"],
+            custom_alias=data.get("custom_alias"),
+            created_at=datetime.fromisoformat(data["created_at"]),
+            updated_at=datetime.fromisoformat(data["updated_at"]) if data.get("updated_at") else None,
+            expires_at=datetime.fromisoformat(data["expires_at"]) if data["expires_at"] else None,
+            last_accessed_at=datetime.fromisoformat(data["last_accessed_at"]) if data["last_accessed_at"] else None,
+            access_count=data["access_count"],
+            owner_id=data["owner_id"]
+        )
+
+
+class RedirectTarget(NamedTuple):
+    """What a redirect needs: the target and when it stops being valid."""
+    original_url: str
+    expires_at: Optional[datetime]
+
+
+# Columns in URLRecord field order, for projection queries and RETURNING
+URL_RECORD_COLUMNS = [getattr(URL.__table__.c, field) for field in URLRecord._fields]
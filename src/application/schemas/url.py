@@ -1,14 +1,23 @@
-from pydantic import BaseModel, AnyHttpUrl
+from pydantic import BaseModel, AnyHttpUrl, Field, field_validator, model_validator
 from datetime import datetime
-from typing import Optional
+from enum import Enum
+from typing import List, Optional
 
 class URLBase(BaseModel):
     original_url: str
     custom_alias: Optional[str] = None
     expires_at: Optional[datetime] = None
 
+# Path segments of /links routes that a custom alias would collide with
+RESERVED_ALIASES = frozenset({"search", "shorten", "stats", "trending"})
+
 class URLCreate(URLBase):
-    pass
+    @field_validator("custom_alias")
+    @classmethod
+    def check_alias(cls, value: Optional[str]) -> Optional[str]:
+        if value in RESERVED_ALIASES:
+            raise ValueError(f"'{value}' is reserved and cannot be used as an alias")
+        return value
 
 class URLUpdate(BaseModel):
     original_url: Optional[str] = None
@@ -18,6 +27,7 @@ class URLInDB(URLBase):
     id: int
     short_code: str
     created_at: datetime
+    updated_at: Optional[datetime] = None
     last_accessed_at: Optional[datetime] = None
     access_count: int
     owner_id: Optional[int] = None
@@ -26,10 +36,58 @@ class URLInDB(URLBase):
         from_attributes = True
 
 class URLStats(URLInDB):
-    pass
+    unique_visitors: Optional[int] = None
+
+class URLStatsBatchRequest(BaseModel):
+    short_codes: List[str] = Field(..., min_length=1, max_length=5000)
+
+class URLStatsBatchItem(BaseModel):
+    short_code: str
+    found: bool
+    stats: Optional[URLStats] = None
+
+class URLStatsBatchResult(BaseModel):
+    results: List[URLStatsBatchItem]
+
+class URLBulkSelector(BaseModel):
+    """Either an explicit list of short codes or an expiry range."""
+    short_codes: Optional[List[str]] = Field(None, min_length=1, max_length=50000)
+    expires_after: Optional[datetime] = None
+    expires_before: Optional[datetime] = None
+
+    @model_validator(mode="after")
+    def check_selector(self):
+        has_range = self.expires_after is not None or self.expires_before is not None
+        if (self.short_codes is None) == (not has_range):
+            raise ValueError("Provide either short_codes or an expires_after/expires_before range")
+        return self
+
+class URLBulkUpdate(URLBulkSelector):
+    update: URLUpdate
+
+class URLBulkItemResult(BaseModel):
+    short_code: str
+    status: str
+
+class URLBulkResult(BaseModel):
+    affected: int
+    results: List[URLBulkItemResult]
 
 class URLResponse(BaseModel):
     short_url: str
     original_url: str
     custom_alias: Optional[str] = None
-    expires_at: Optional[datetime] = None 
\ No newline at end of file
+    expires_at: Optional[datetime] = None 
+
+class URLSearchPage(BaseModel):
+    items: List[URLResponse]
+    next_cursor: Optional[str] = None
+
+class TrendingWindow(str, Enum):
+    hour = "1h"
+    day = "24h"
+    week = "7d"
+
+class TrendingLink(BaseModel):
+    short_code: str
+    score: float
\ No newline at end of file
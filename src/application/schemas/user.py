@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
 class UserBase(BaseModel):
@@ -26,6 +26,22 @@ class User(UserInDB):
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+    expires_in: Optional[int] = None  # seconds until the access token expires
+
+class TokenRefresh(BaseModel):
+    refresh_token: str
 
 class TokenPayload(BaseModel):
-    sub: Optional[int] = None 
\ No newline at end of file
+    sub: Optional[int] = None
+
+class OwnerTopLink(BaseModel):
+    short_code: str
+    access_count: int
+
+class OwnerStats(BaseModel):
+    total_links: int
+    active_links: int
+    expired_links: int
+    total_clicks: int
+    top_links: List[OwnerTopLink]
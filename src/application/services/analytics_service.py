@@ -0,0 +1,156 @@
+import hashlib
+import random
+from datetime import date, datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+from ..core.config import settings
+from ..db.cache import redis_client
+
+# Half-life in seconds of each trending window
+TRENDING_HALF_LIVES = {"1h": 3600, "24h": 86400, "7d": 7 * 86400}
+# Trending scores are kept relative to an epoch that moves forward every this
+# many half-lives, so a single click never weighs more than 2 ** 32.
+TRENDING_EPOCH_HALF_LIVES = 32
+
+def visitor_id(ip: Optional[str], user_agent: Optional[str]) -> str:
+    """Hash a visitor's IP and user agent so raw values never reach Redis."""
+    return hashlib.sha1(f"{ip or ''}|{user_agent or ''}".encode()).hexdigest()[:16]
+
+def _visitors_key(short_code: str, day: date) -> str:
+    return f"hll:{short_code}:{day:%Y%m%d}"
+
+def _visitors_keys(short_code: str, start: date, end: date) -> List[str]:
+    days = (end - start).days + 1
+    return [_visitors_key(short_code, start + timedelta(days=i)) for i in range(max(days, 0))]
+
+def _trending_epoch(half_life: int, timestamp: float) -> int:
+    period = half_life * TRENDING_EPOCH_HALF_LIVES
+    return int(timestamp // period * period)
+
+def _trending_key(window: str, epoch: int) -> str:
+    return f"trending:{window}:{epoch}"
+
+def record_redirect(short_code: str, ip: Optional[str], user_agent: Optional[str], now: Optional[datetime] = None) -> None:
+    """Record a redirect in the visitor sketch and the trending sets.
+
+    The visitor goes into the link's HyperLogLog for the current day, which
+    Redis caps at ~12KB regardless of traffic and which expires after
+    UNIQUE_VISITORS_RETENTION_DAYS.
+
+    Trending uses forward exponential decay: instead of decaying every score
+    over time, each click adds 2 ** ((now - epoch) / half_life), so newer
+    clicks weigh more and ranking the set by score ranks by decayed count.
+    All updates go out in one pipeline.
+    """
+    now = now or datetime.utcnow()
+    timestamp = now.replace(tzinfo=timezone.utc).timestamp()
+    visitors_key = _visitors_key(short_code, now.date())
+
+    pipe = redis_client.pipeline()
+    pipe.pfadd(visitors_key, visitor_id(ip, user_agent))
+    pipe.expire(visitors_key, timedelta(days=settings.UNIQUE_VISITORS_RETENTION_DAYS + 1))
+    epochs = []
+    for window, half_life in TRENDING_HALF_LIVES.items():
+        epoch = _trending_epoch(half_life, timestamp)
+        key = _trending_key(window, epoch)
+        pipe.zincrby(key, 2 ** ((timestamp - epoch) / half_life), short_code)
+        pipe.expire(key, 2 * half_life * TRENDING_EPOCH_HALF_LIVES)
+        # The first click of an epoch claims the job of carrying old scores over
+        pipe.set(f"{key}:carried", 1, nx=True, ex=2 * half_life * TRENDING_EPOCH_HALF_LIVES)
+        epochs.append((window, half_life, epoch, len(pipe) - 1))
+        if random.random() < 0.01:
+            pipe.zremrangebyrank(key, 0, -settings.TRENDING_MAX_LINKS - 1)
+    results = pipe.execute()
+
+    for window, half_life, epoch, position in epochs:
+        if results[position]:
+            _carry_trending(window, half_life, epoch)
+
+def _carry_trending(window: str, half_life: int, epoch: int) -> None:
+    """Move the previous epoch's scores into a new epoch.
+
+    Rescaling by 2 ** -TRENDING_EPOCH_HALF_LIVES re-expresses old scores
+    relative to the new epoch, which keeps them from growing without bound.
+    Clicks already added to the new set are kept with weight 1.
+    """
+    previous = epoch - half_life * TRENDING_EPOCH_HALF_LIVES
+    key = _trending_key(window, epoch)
+    pipe = redis_client.pipeline(transaction=True)
+    pipe.zunionstore(
+        key,
+        {key: 1, _trending_key(window, previous): 2.0 ** -TRENDING_EPOCH_HALF_LIVES}
+    )
+    pipe.zremrangebyrank(key, 0, -settings.TRENDING_MAX_LINKS - 1)
+    pipe.expire(key, 2 * half_life * TRENDING_EPOCH_HALF_LIVES)
+    pipe.execute()
+
+def top_trending(window: str, limit: int = 10, now: Optional[datetime] = None) -> List[Tuple[str, float]]:
+    """Get the top links of a window with their decayed click counts.
+
+    Reads the current epoch's set, or the previous one while the current
+    epoch has no clicks yet. Runs in O(log N + limit) in a single round trip.
+    """
+    half_life = TRENDING_HALF_LIVES[window]
+    timestamp = (now or datetime.utcnow()).replace(tzinfo=timezone.utc).timestamp()
+    epoch = _trending_epoch(half_life, timestamp)
+    previous = epoch - half_life * TRENDING_EPOCH_HALF_LIVES
+
+    pipe = redis_client.pipeline()
+    pipe.exists(f"{_trending_key(window, epoch)}:carried")
+    pipe.zrevrange(_trending_key(window, epoch), 0, limit - 1, withscores=True)
+    pipe.zrevrange(_trending_key(window, previous), 0, limit - 1, withscores=True)
+    carried, current, older = pipe.execute()
+
+    links, base = (current, epoch) if carried else (older, previous)
+    decay = 2 ** (-(timestamp - base) / half_life)
+    return [(short_code, score * decay) for short_code, score in links]
+
+def count_unique_visitors(short_code: str, start: date, end: date) -> int:
+    """Estimate unique visitors between two days (inclusive).
+
+    PFCOUNT over several sketches returns the cardinality of their union.
+    Days before today no longer change, so they are PFMERGEd once into a
+    cached range sketch and later calls only count that plus today's sketch.
+    All keys of a link share a cache node, so every step is node-local.
+    """
+    today = datetime.utcnow().date()
+    if end < today or start >= today:
+        keys = _visitors_keys(short_code, start, end)
+        return redis_client.pfcount(*keys) if keys else 0
+
+    yesterday = today - timedelta(days=1)
+    merged = f"hll:{short_code}:{start:%Y%m%d}-{yesterday:%Y%m%d}"
+    current = _visitors_key(short_code, today)
+    pipe = redis_client.pipeline()
+    pipe.exists(merged)
+    pipe.pfcount(merged, current)
+    exists, count = pipe.execute()
+    if exists:
+        return count
+
+    pipe = redis_client.pipeline(transaction=True)
+    pipe.pfmerge(merged, *_visitors_keys(short_code, start, yesterday))
+    pipe.expire(merged, timedelta(hours=1))
+    pipe.pfcount(merged, current)
+    return pipe.execute()[-1]
+
+def forget_links(short_codes: List[str], include_visitors: bool = True) -> None:
+    """Drop deleted links from the trending sets and visitor sketches.
+
+    Bulk deletes skip the visitor sketches (about 90 keys per link); those
+    expire on their own after UNIQUE_VISITORS_RETENTION_DAYS.
+    """
+    if not short_codes:
+        return
+    if include_visitors:
+        end = datetime.utcnow().date()
+        start = end - timedelta(days=settings.UNIQUE_VISITORS_RETENTION_DAYS)
+        keys = [key for code in short_codes for key in _visitors_keys(code, start, end)]
+        redis_client.unlink(*keys)
+
+    timestamp = datetime.utcnow().replace(tzinfo=timezone.utc).timestamp()
+    pipe = redis_client.pipeline()
+    for window, half_life in TRENDING_HALF_LIVES.items():
+        epoch = _trending_epoch(half_life, timestamp)
+        pipe.zrem(_trending_key(window, epoch), *short_codes)
+        pipe.zrem(_trending_key(window, epoch - half_life * TRENDING_EPOCH_HALF_LIVES), *short_codes)
+    pipe.execute()
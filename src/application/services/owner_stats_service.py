@@ -0,0 +1,158 @@
+import heapq
+from datetime import datetime, timezone
+from itertools import groupby
+from typing import Iterable, List, Optional, Tuple
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from ..models.models import URL, User
+from ..schemas.user import OwnerStats, OwnerTopLink
+from ..db.cache import redis_client
+from ..db.shards import shard_router
+
+# Per-owner aggregates, all routed by the owner id so they share a cache node:
+#   owner:<id>:stats     hash: links, clicks, reconciled_at
+#   owner:<id>:expiries  zset: short_code -> expiry timestamp (links that expire)
+#   owner:<id>:top       zset: short_code -> flushed access count
+# Write paths adjust them incrementally and reconcile_owner_stats rebuilds them
+# from the database to correct drift. A hash without reconciled_at has never
+# been rebuilt and is rebuilt on first read.
+
+def _stats_key(owner_id: int) -> str:
+    return f"owner:{owner_id}:stats"
+
+def _expiries_key(owner_id: int) -> str:
+    return f"owner:{owner_id}:expiries"
+
+def _top_key(owner_id: int) -> str:
+    return f"owner:{owner_id}:top"
+
+def _timestamp(value: datetime) -> float:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+def link_created(owner_id: int, short_code: str, expires_at: Optional[datetime]) -> None:
+    pipe = redis_client.pipeline(transaction=True)
+    pipe.hincrby(_stats_key(owner_id), "links", 1)
+    pipe.zadd(_top_key(owner_id), {short_code: 0}, nx=True)
+    if expires_at is not None:
+        pipe.zadd(_expiries_key(owner_id), {short_code: _timestamp(expires_at)})
+    pipe.execute()
+
+def links_removed(owner_id: int, links: List[Tuple[str, int]]) -> None:
+    """Take deleted (short_code, access_count) pairs out of the aggregates."""
+    if not links:
+        return
+    codes = [code for code, _ in links]
+    pipe = redis_client.pipeline(transaction=True)
+    pipe.hincrby(_stats_key(owner_id), "links", -len(links))
+    pipe.hincrby(_stats_key(owner_id), "clicks", -sum(count or 0 for _, count in links))
+    pipe.zrem(_expiries_key(owner_id), *codes)
+    pipe.zrem(_top_key(owner_id), *codes)
+    pipe.execute()
+
+def expiries_changed(owner_id: int, links: List[Tuple[str, Optional[datetime]]]) -> None:
+    """Record new (short_code, expires_at) values."""
+    expiring = {code: _timestamp(expires_at) for code, expires_at in links if expires_at is not None}
+    permanent = [code for code, expires_at in links if expires_at is None]
+    pipe = redis_client.pipeline(transaction=True)
+    if expiring:
+        pipe.zadd(_expiries_key(owner_id), expiring)
+    if permanent:
+        pipe.zrem(_expiries_key(owner_id), *permanent)
+    pipe.execute()
+
+def clicks_flushed(clicks: Iterable[Tuple[int, str, int]]) -> None:
+    """Add (owner_id, short_code, count) clicks that reached the database."""
+    pipe = redis_client.pipeline()
+    for owner_id, short_code, count in clicks:
+        pipe.hincrby(_stats_key(owner_id), "clicks", count)
+        pipe.zincrby(_top_key(owner_id), count, short_code)
+    pipe.execute()
+
+def _rebuild(owner_id: int, links: List[Tuple[str, Optional[int], Optional[datetime]]]) -> None:
+    """Replace an owner's aggregates with (short_code, access_count, expires_at) rows."""
+    pipe = redis_client.pipeline(transaction=True)
+    pipe.delete(_stats_key(owner_id))
+    pipe.delete(_expiries_key(owner_id))
+    pipe.delete(_top_key(owner_id))
+    pipe.hset(_stats_key(owner_id), mapping={
+        "links": len(links),
+        "clicks": sum(count or 0 for _, count, _ in links),
+        "reconciled_at": datetime.utcnow().replace(tzinfo=timezone.utc).timestamp()
+    })
+    expiring = {code: _timestamp(expires_at) for code, _, expires_at in links if expires_at is not None}
+    if expiring:
+        pipe.zadd(_expiries_key(owner_id), expiring)
+    if links:
+        pipe.zadd(_top_key(owner_id), {code: count or 0 for code, count, _ in links})
+    pipe.execute()
+
+def reconcile_owner_stats(db: Session, owner_id: Optional[int] = None) -> int:
+    """Rebuild aggregates from the database, for one owner or all users.
+
+    Streams users and every link shard's links in owner order and merges
+    them, so memory is bounded by the largest owner. Returns the number of
+    owners rebuilt.
+    """
+    users = select(User.id).order_by(User.id)
+    links = (
+        select(URL.owner_id, URL.short_code, URL.access_count, URL.expires_at)
+        .where(URL.owner_id.isnot(None))
+        .order_by(URL.owner_id)
+    )
+    if owner_id is not None:
+        users = users.where(User.id == owner_id)
+        links = links.where(URL.owner_id == owner_id)
+    streams = [
+        shard_router.session(db, shard).execute(links.execution_options(yield_per=1000))
+        for shard in range(shard_router.count)
+    ]
+    by_owner = groupby(heapq.merge(*streams, key=lambda row: row[0]), key=lambda row: row[0])
+    group = next(by_owner, None)
+    rebuilt = 0
+    for user_id in db.scalars(users.execution_options(yield_per=1000)):
+        # Skip links whose owner no longer exists
+        while group is not None and group[0] < user_id:
+            group = next(by_owner, None)
+        owned = []
+        if group is not None and group[0] == user_id:
+            owned = [(code, count, expires_at) for _, code, count, expires_at in group[1]]
+            group = next(by_owner, None)
+        _rebuild(user_id, owned)
+        rebuilt += 1
+    if owner_id is not None and not rebuilt:
+        _rebuild(owner_id, [])
+    return rebuilt
+
+def get_owner_stats(db: Session, owner_id: int, top: int = 5, now: Optional[datetime] = None) -> OwnerStats:
+    """Read an owner's dashboard from the aggregates in one round trip.
+
+    Cost depends on `top`, not on the number of links: one HMGET, a ZCOUNT of
+    expired links and a ZREVRANGE of the top links. Aggregates that were
+    never rebuilt are rebuilt once and read again; if the rebuild did not
+    stick (e.g. evicted), whatever was read is returned.
+    """
+    timestamp = _timestamp(now or datetime.utcnow())
+    for attempt in range(2):
+        pipe = redis_client.pipeline()
+        pipe.hmget(_stats_key(owner_id), "links", "clicks", "reconciled_at")
+        pipe.zcount(_expiries_key(owner_id), "-inf", timestamp)
+        pipe.zrevrange(_top_key(owner_id), 0, top - 1, withscores=True)
+        (links, clicks, reconciled_at), expired, top_links = pipe.execute()
+        if reconciled_at is not None or attempt:
+            break
+        reconcile_owner_stats(db, owner_id)
+
+    links = int(links or 0)
+    expired = min(expired, links)
+    return OwnerStats(
+        total_links=links,
+        active_links=links - expired,
+        expired_links=expired,
+        total_clicks=int(clicks or 0),
+        top_links=[
+            OwnerTopLink(short_code=code, access_count=int(count))
+            for code, count in top_links
+        ]
+    )
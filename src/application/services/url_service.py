@@ -1,144 +1,217 @@
+import logging
 import random
 import string
+from collections import defaultdict
 from datetime import datetime
-from typing import Optional
+from typing import Callable, List, Optional, Tuple
+from urllib.parse import urlsplit
+from sqlalchemy import and_, bindparam, cast, delete, exists, literal, or_, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
 from ..models.models import URL
-from ..schemas.url import URLCreate, URLUpdate
+from ..models.records import URLRecord, RedirectTarget, URL_RECORD_COLUMNS
+from ..schemas.url import URLCreate, URLUpdate, URLBulkSelector
 from ..core.config import settings
-import redis
+from ..core.http_cache import as_utc
+from ..core.metrics import metrics
+from ..db.cache import redis_client, cache_fallback
+from ..db.shards import shard_router
+from ..db.snapshot import RedirectSnapshot
+from . import analytics_service, owner_stats_service
+import heapq
 import json
+import redis
+
+logger = logging.getLogger(__name__)
+
+# Per-node set of short codes with clicks waiting to be flushed to the database
+CLICKS_DIRTY_KEY = "clicks:dirty"
+
+# KEYS: url:<code>, clicks:<code>, clicks:dirty  ARGV: now (epoch seconds), code
+# Returns {original_url, expires_ts or ""} on a hit; counts the click only if
+# the link has not expired. Old cache entries without expires_ts are misses.
+REDIRECT_SCRIPT = """
+local cached = redis.call('GET', KEYS[1])
+if not cached then return false end
+local ok, data = pcall(cjson.decode, cached)
+if not ok or data['expires_ts'] == nil then return false end
+local expires = data['expires_ts']
+if expires == cjson.null then
+    expires = ''
+elseif tonumber(expires) <= tonumber(ARGV[1]) then
+    return {data['original_url'], tostring(expires)}
+end
+redis.call('HINCRBY', KEYS[2], 'count', 1)
+redis.call('HSET', KEYS[2], 'last', ARGV[1])
+redis.call('SADD', KEYS[3], ARGV[2])
+return {data['original_url'], tostring(expires)}
+"""
+
+# Last resort for redirects when the database is unreachable
+redirect_snapshot = RedirectSnapshot(settings.SNAPSHOT_DIR)
 
-redis_client = redis.Redis(
-    host=settings.REDIS_HOST,
-    port=settings.REDIS_PORT,
-    decode_responses=True
-)
+def _timestamp(value: datetime) -> float:
+    return as_utc(value).timestamp()
 
-def generate_short_code(length: int = 6) -> str:
-    """Generate a random short code for the URL."""
+def generate_short_code(length: int = 6, shard: int = 0) -> str:
+    """Generate a random short code for the URL that routes to `shard`."""
     characters = string.ascii_letters + string.digits
-    return ''.join(random.choice(characters) for _ in range(length))
+    first = random.choice(shard_router.first_chars(shard))
+    return first + ''.join(random.choice(characters) for _ in range(length - 1))
 
-def create_url(db: Session, url: URLCreate, user_id: Optional[int] = None) -> URL:
-    """Create a new URL with a short code."""
-    short_code = url.custom_alias or generate_short_code()
-    
-    original_url = str(url.original_url).rstrip('/')
-    
-    db_url = URL(
-        original_url=original_url,
-        short_code=short_code,
-        custom_alias=url.custom_alias,
-        expires_at=url.expires_at,
-        owner_id=user_id,
-        created_at=datetime.utcnow(),
-        access_count=0
+def search_key(url: str) -> Optional[str]:
+    """Index key for domain/prefix search: the host with its labels reversed,
+    then the path and query ("https://www.example.com/a?b" -> "com.example.www/a?b").
+
+    The scheme, port and fragment are left out. None for URLs without a host.
+    """
+    parts = urlsplit(url if "//" in url else f"//{url}")
+    if not parts.hostname:
+        return None
+    key = ".".join(reversed(parts.hostname.strip(".").split("."))) + "/" + parts.path.lstrip("/")
+    return f"{key}?{parts.query}" if parts.query else key
+
+def _cache_url(url: URLRecord) -> None:
+    """Store a URL's fields in the Redis cache, if it is reachable."""
+    with cache_fallback("write"):
+        redis_client.setex(f"url:{url.short_code}", 3600, _cache_entry(url))
+
+def _cache_entry(url: URLRecord) -> str:
+    return json.dumps({
+        "id": url.id,
+        "original_url": url.original_url,
+        "expires_at": url.expires_at.isoformat() if url.expires_at else None,
+        "short_code": url.short_code,
+        "custom_alias": url.custom_alias,
+        "owner_id": url.owner_id,
+        "access_count": url.access_count,
+        "last_accessed_at": url.last_accessed_at.isoformat() if url.last_accessed_at else None,
+        "created_at": url.created_at.isoformat(),
+        "updated_at": url.updated_at.isoformat() if url.updated_at else None,
+        "expires_ts": int(_timestamp(url.expires_at)) if url.expires_at else None
+    })
+
+def _insert_url_statement(db: Session, values: dict):
+    """INSERT ... SELECT ... WHERE NOT EXISTS ... ON CONFLICT DO NOTHING RETURNING.
+
+    The NOT EXISTS guard skips the insert when the owner already has a link to
+    the same target (best-effort, see create_url), and ON CONFLICT turns a taken short code or alias into an
+    empty result instead of an IntegrityError. Both Postgres and SQLite
+    (3.35+) support this form.
+    """
+    is_sqlite = db.get_bind().dialect.name == "sqlite"
+    insert = sqlite.insert if is_sqlite else postgresql.insert
+    table = URL.__table__
+    owner_match = (
+        table.c.owner_id.is_(None) if values["owner_id"] is None
+        else table.c.owner_id == values["owner_id"]
     )
+    duplicate = select(table.c.id).where(table.c.original_url == values["original_url"], owner_match)
+    # Postgres types bare parameters in a SELECT list as text, so cast them;
+    # SQLite's CAST would coerce datetimes to numbers, so leave them bare there.
+    columns = [literal(value, table.c[name].type) for name, value in values.items()]
+    if not is_sqlite:
+        columns = [cast(column, column.type) for column in columns]
+    source = select(*columns).where(~exists(duplicate))
+    return (
+        insert(table)
+        .from_select(list(values), source)
+        .on_conflict_do_nothing()
+        .returning(*URL_RECORD_COLUMNS)
+    )
+
+def create_url(db: Session, url: URLCreate, user_id: Optional[int] = None) -> Optional[URLRecord]:
+    """Create a new URL with a short code in a single round trip.
+
+    Returns the owner's existing link when one already points at the same
+    URL, and None when the custom alias is taken. Generated codes go to the
+    owner's home shard and aliases to the shard they route to; only that
+    shard is checked for an existing link.
+
+    Deduplication is best-effort: there is no unique constraint on
+    (owner_id, original_url), since bulk updates may point several links at
+    one target, so two concurrent creates of the same URL can both insert.
+    Both short codes then work.
+    """
+    original_url = str(url.original_url).rstrip('/')
+    if url.custom_alias:
+        shard = shard_router.shard_for_code(url.custom_alias)
+    else:
+        shard = shard_router.home_shard(user_id, original_url)
+    db = shard_router.session(db, shard)
     
-    db.add(db_url)
-    db.commit()
-    db.refresh(db_url)
-    
-    cache_key = f"url:{short_code}"
-    redis_client.setex(
-        cache_key,
-        3600,
-        json.dumps({
+    for _ in range(5):
+        values = {
             "original_url": original_url,
-            "expires_at": url.expires_at.isoformat() if url.expires_at else None,
-            "short_code": short_code,
+            "search_key": search_key(original_url),
+            "short_code": url.custom_alias or generate_short_code(shard=shard),
             "custom_alias": url.custom_alias,
+            "expires_at": url.expires_at,
             "owner_id": user_id,
-            "access_count": 0,
-            "last_accessed_at": None,
-            "created_at": datetime.utcnow().isoformat()
-        })
-    )
+            "created_at": datetime.utcnow(),
+            "access_count": 0
+        }
+        row = db.execute(_insert_url_statement(db, values)).first()
+        if row is not None:
+            db.commit()
+            db_url = URLRecord._make(row)
+            _cache_url(db_url)
+            if user_id is not None:
+                with cache_fallback("owner stats"):
+                    owner_stats_service.link_created(user_id, db_url.short_code, db_url.expires_at)
+            return db_url
+        
+        # Nothing inserted: either a duplicate target or a short code conflict
+        owner_match = URL.owner_id.is_(None) if user_id is None else URL.owner_id == user_id
+        existing = db.execute(
+            select(*URL_RECORD_COLUMNS).where(URL.original_url == original_url, owner_match).limit(1)
+        ).first()
+        db.commit()
+        if existing is not None:
+            return URLRecord._make(existing)
+        if url.custom_alias:
+            return None
     
-    return db_url
+    raise RuntimeError("Could not generate a unique short code")
+
+def _fetch_url_record(db: Session, short_code: str) -> Optional[URLRecord]:
+    """Load a URL with a projection query and refresh its cache entry."""
+    db = shard_router.for_code(db, short_code)
+    row = db.execute(select(*URL_RECORD_COLUMNS).where(URL.short_code == short_code)).first()
+    if row is None:
+        return None
+    url = URLRecord._make(row)
+    _cache_url(url)
+    return url
 
-def get_url_by_short_code(db: Session, short_code: str) -> Optional[URL]:
+def get_url_by_short_code(db: Session, short_code: str) -> Optional[URLRecord]:
     """Get URL by short code, first checking Redis cache."""
-    cache_key = f"url:{short_code}"
-    cached_url = redis_client.get(cache_key)
+    cached_url = None
+    with cache_fallback("read"):
+        cached_url = redis_client.get(f"url:{short_code}")
     
-    if cached_url:
-        try:
-            cached_data = json.loads(cached_url)
-            required_fields = ["original_url", "short_code", "expires_at", "owner_id", "access_count", "last_accessed_at", "created_at"]
-            if not all(key in cached_data for key in required_fields):
-                
-                url = db.query(URL).filter(URL.short_code == short_code).first()
-                if url:
-                    redis_client.setex(
-                        cache_key,
-                        3600,
-                        json.dumps({
-                            "original_url": url.original_url,
-                            "expires_at": url.expires_at.isoformat() if url.expires_at else None,
-                            "short_code": url.short_code,
-                            "custom_alias": url.custom_alias,
-                            "owner_id": url.owner_id,
-                            "access_count": url.access_count,
-                            "last_accessed_at": url.last_accessed_at.isoformat() if url.last_accessed_at else None,
-                            "created_at": url.created_at.isoformat()
-                        })
-                    )
-                return url
-            
-            return URL(
-                id=1,
-                original_url=cached_data["original_url"],
-                short_code=cached_data["short_code"],
-                custom_alias=cached_data.get("custom_alias"),
-                expires_at=datetime.fromisoformat(cached_data["expires_at"]) if cached_data["expires_at"] else None,
-                owner_id=cached_data["owner_id"],
-                access_count=cached_data["access_count"],
-                last_accessed_at=datetime.fromisoformat(cached_data["last_accessed_at"]) if cached_data["last_accessed_at"] else None,
-                created_at=datetime.fromisoformat(cached_data["created_at"])
-            )
-        except (json.JSONDecodeError, ValueError):
-            url = db.query(URL).filter(URL.short_code == short_code).first()
-            if url:
-                redis_client.setex(
-                    cache_key,
-                    3600,
-                    json.dumps({
-                        "original_url": url.original_url,
-                        "expires_at": url.expires_at.isoformat() if url.expires_at else None,
-                        "short_code": url.short_code,
-                        "custom_alias": url.custom_alias,
-                        "owner_id": url.owner_id,
-                        "access_count": url.access_count,
-                        "last_accessed_at": url.last_accessed_at.isoformat() if url.last_accessed_at else None,
-                        "created_at": url.created_at.isoformat()
-                    })
-                )
-            return url
-    
-    url = db.query(URL).filter(URL.short_code == short_code).first()
-    
-    if url:
-        redis_client.setex(
-            cache_key,
-            3600,
-            json.dumps({
-                "original_url": url.original_url,
-                "expires_at": url.expires_at.isoformat() if url.expires_at else None,
-                "short_code": url.short_code,
-                "custom_alias": url.custom_alias,
-                "owner_id": url.owner_id,
-                "access_count": url.access_count,
-                "last_accessed_at": url.last_accessed_at.isoformat() if url.last_accessed_at else None,
-                "created_at": url.created_at.isoformat()
-            })
-        )
-    
-    return url
+    url = _record_from_cache(cached_url)
+    if url is not None:
+        return url
+    return _fetch_url_record(db, short_code)
+
+def _record_from_cache(cached_url: Optional[str]) -> Optional[URLRecord]:
+    """Parse a cache entry; None for misses and entries in an older format."""
+    if not cached_url:
+        return None
+    try:
+        cached_data = json.loads(cached_url)
+        required_fields = ["id", "original_url", "short_code", "expires_at", "owner_id", "access_count", "last_accessed_at", "created_at"]
+        if all(key in cached_data for key in required_fields):
+            return URLRecord.from_cache(cached_data)
+    except (json.JSONDecodeError, ValueError):
+        pass
+    return None
 
 def update_url(db: Session, short_code: str, url_update: URLUpdate) -> Optional[URL]:
     """Update URL details."""
+    db = shard_router.for_code(db, short_code)
     db_url = db.query(URL).filter(URL.short_code == short_code).first()
     if not db_url:
         return None
@@ -146,48 +219,432 @@ def update_url(db: Session, short_code: str, url_update: URLUpdate) -> Optional[
     update_data = url_update.dict(exclude_unset=True)
     if "original_url" in update_data:
         update_data["original_url"] = str(update_data["original_url"]).rstrip('/')
+        update_data["search_key"] = search_key(update_data["original_url"])
     
     for field, value in update_data.items():
         setattr(db_url, field, value)
+    db_url.updated_at = datetime.utcnow()
     
     db.commit()
     db.refresh(db_url)
     
-    redis_client.delete(f"url:{short_code}")
+    with cache_fallback("invalidate"):
+        redis_client.delete(f"url:{short_code}")
+    if "expires_at" in update_data and db_url.owner_id is not None:
+        with cache_fallback("owner stats"):
+            owner_stats_service.expiries_changed(db_url.owner_id, [(short_code, db_url.expires_at)])
     
     return db_url
 
 def delete_url(db: Session, short_code: str) -> bool:
     """Delete URL by short code."""
+    db = shard_router.for_code(db, short_code)
     db_url = db.query(URL).filter(URL.short_code == short_code).first()
     if not db_url:
         return False
+    owner_id, access_count = db_url.owner_id, db_url.access_count
     
     db.delete(db_url)
     db.commit()
     
-    redis_client.delete(f"url:{short_code}")
+    with cache_fallback("invalidate"):
+        redis_client.delete(f"url:{short_code}")
+        analytics_service.forget_links([short_code])
+    if owner_id is not None:
+        with cache_fallback("owner stats"):
+            owner_stats_service.links_removed(owner_id, [(short_code, access_count)])
     
     return True
 
-def get_url_stats(db: Session, short_code: str) -> Optional[URL]:
-    """Get URL statistics."""
-    return get_url_by_short_code(db, short_code)
+def _bulk_execute(db: Session, owner_id: int, selector: URLBulkSelector, statement: Callable) -> list:
+    """Run a set-based statement over the owner's matching URLs.
+
+    An explicit code list only visits the shards its codes route to, split
+    into BULK_CHUNK_SIZE IN-lists; a range selector is a single statement on
+    every shard. Shards run in parallel and each commits once, so a failure
+    can leave other shards' changes applied. Returns (short_code,
+    access_count, expires_at) rows for the affected URLs.
+    """
+    conditions = [URL.owner_id == owner_id]
+    if selector.expires_after is not None:
+        conditions.append(URL.expires_at >= selector.expires_after)
+    if selector.expires_before is not None:
+        conditions.append(URL.expires_at < selector.expires_before)
+    
+    if selector.short_codes is None:
+        work = {shard: [None] for shard in range(shard_router.count)}
+    else:
+        groups = shard_router.group_by_shard(dict.fromkeys(selector.short_codes))
+        work = {
+            shard: [codes[i:i + settings.BULK_CHUNK_SIZE] for i in range(0, len(codes), settings.BULK_CHUNK_SIZE)]
+            for shard, codes in groups.items()
+        }
+    
+    def run(session: Session, shard: int) -> list:
+        affected = []
+        for chunk in work[shard]:
+            where = conditions if chunk is None else conditions + [URL.short_code.in_(chunk)]
+            stmt = statement(and_(*where)).returning(URL.short_code, URL.access_count, URL.expires_at)
+            affected.extend(session.execute(stmt.execution_options(synchronize_session=False)).all())
+        session.commit()
+        return affected
+    
+    if not work:
+        return []
+    return [row for rows in shard_router.scatter(db, run, work) for row in rows]
 
-def search_url_by_original(db: Session, original_url: str, user_id: Optional[int] = None) -> Optional[URL]:
-    """Search URL by original URL."""
+def _invalidate_urls(short_codes: List[str]) -> None:
+    """Drop cache entries with one pipelined UNLINK batch per node."""
+    with cache_fallback("invalidate"):
+        pipe = redis_client.pipeline()
+        for short_code in short_codes:
+            pipe.unlink(f"url:{short_code}")
+        pipe.execute()
+
+def bulk_delete_urls(db: Session, owner_id: int, selector: URLBulkSelector) -> List[str]:
+    """Delete the owner's URLs matching a selector and return their codes."""
+    rows = _bulk_execute(db, owner_id, selector, lambda where: delete(URL).where(where))
+    deleted = [row.short_code for row in rows]
+    _invalidate_urls(deleted)
+    with cache_fallback("invalidate"):
+        analytics_service.forget_links(deleted, include_visitors=False)
+    with cache_fallback("owner stats"):
+        owner_stats_service.links_removed(owner_id, [(row.short_code, row.access_count) for row in rows])
+    return deleted
+
+def bulk_update_urls(db: Session, owner_id: int, selector: URLBulkSelector, url_update: URLUpdate) -> List[str]:
+    """Update the owner's URLs matching a selector and return their codes."""
+    update_data = url_update.dict(exclude_unset=True)
+    if "original_url" in update_data:
+        update_data["original_url"] = str(update_data["original_url"]).rstrip('/')
+        update_data["search_key"] = search_key(update_data["original_url"])
+    update_data["updated_at"] = datetime.utcnow()
+    
+    rows = _bulk_execute(db, owner_id, selector, lambda where: update(URL).where(where).values(**update_data))
+    updated = [row.short_code for row in rows]
+    _invalidate_urls(updated)
+    if "expires_at" in update_data:
+        with cache_fallback("owner stats"):
+            owner_stats_service.expiries_changed(owner_id, [(row.short_code, row.expires_at) for row in rows])
+    return updated
+
+def resolve_redirect(db: Session, short_code: str) -> Optional[RedirectTarget]:
+    """Resolve a short code for a redirect and count the click.
+    
+    A cached link costs one EVALSHA that returns the target, checks expiry
+    and buffers the click in Redis, with no database work. Otherwise the link
+    is loaded through get_url_by_short_code and the click is buffered
+    separately. Buffered clicks reach the database via flush_clicks.
+    
+    If Redis is down (or its circuit breaker is open) the link comes from the
+    database and the click is written there directly. If the database fails
+    too, the link is looked up in the redirect snapshot and the click is lost.
+    """
+    now = datetime.utcnow()
+    hit = None
+    with cache_fallback("redirect"):
+        hit = redis_client.register_script(REDIRECT_SCRIPT)(
+            keys=[f"url:{short_code}", f"clicks:{short_code}", CLICKS_DIRTY_KEY],
+            args=[_timestamp(now), short_code]
+        )
+    if hit:
+        original_url, expires_ts = hit
+        return RedirectTarget(
+            original_url,
+            datetime.utcfromtimestamp(float(expires_ts)) if expires_ts else None
+        )
+    
+    try:
+        url = get_url_by_short_code(db, short_code)
+    except SQLAlchemyError:
+        target = redirect_snapshot.lookup(short_code)
+        if target is None:
+            raise
+        metrics.incr("redirects.snapshot")
+        return target
+    if not url:
+        return None
+    if not (url.expires_at and as_utc(url.expires_at) <= as_utc(now)):
+        try:
+            record_click(short_code, now)
+        except redis.RedisError:
+            _write_click(db, short_code, now)
+    return RedirectTarget(url.original_url, url.expires_at)
+
+def _write_click(db: Session, short_code: str, now: datetime) -> None:
+    """Count a click straight in the database when it cannot be buffered."""
+    db = shard_router.for_code(db, short_code)
+    db.execute(
+        update(URL)
+        .where(URL.short_code == short_code)
+        .values(access_count=URL.access_count + 1, last_accessed_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+
+def record_click(short_code: str, now: Optional[datetime] = None) -> None:
+    """Buffer a click in Redis; flush_clicks moves it to the database."""
+    timestamp = _timestamp(now or datetime.utcnow())
+    # The dirty set is per node, so it must be the node holding the counter
+    pipe = redis_client.get_client(f"clicks:{short_code}").pipeline(transaction=True)
+    pipe.hincrby(f"clicks:{short_code}", "count", 1)
+    pipe.hset(f"clicks:{short_code}", "last", timestamp)
+    pipe.sadd(CLICKS_DIRTY_KEY, short_code)
+    pipe.execute()
+
+def flush_clicks(db: Session, batch_size: int = 1000) -> int:
+    """Move buffered clicks from every cache node into the database.
+    
+    Each batch pops codes from a node's dirty set, reads and clears their
+    counters in one MULTI/EXEC, and applies them with one executemany
+    UPDATE per link shard. Counters not yet written are restored if a
+    database write fails. Flushed links
+    are evicted from the cache so cached access counts do not go stale, and
+    their clicks are added to the owners' dashboard aggregates.
+    """
+    table = URL.__table__
+    statement = (
+        update(table)
+        .where(table.c.short_code == bindparam("b_short_code"))
+        .values(
+            access_count=table.c.access_count + bindparam("b_count"),
+            last_accessed_at=bindparam("b_last")
+        )
+    )
+    flushed = 0
+    for client in redis_client.clients.values():
+        while True:
+            codes = client.spop(CLICKS_DIRTY_KEY, batch_size)
+            if not codes:
+                break
+            pipe = client.pipeline(transaction=True)
+            for code in codes:
+                pipe.hmget(f"clicks:{code}", "count", "last")
+                pipe.delete(f"clicks:{code}")
+            pending = [
+                (code, int(count), float(last))
+                for code, (count, last) in zip(codes, pipe.execute()[::2])
+                if count
+            ]
+            if not pending:
+                continue
+            
+            by_shard = defaultdict(list)
+            for click in pending:
+                by_shard[shard_router.shard_for_code(click[0])].append(click)
+            owners = {}
+            unwritten = list(by_shard.items())
+            while unwritten:
+                session = shard_router.session(db, unwritten[0][0])
+                clicks = unwritten[0][1]
+                try:
+                    owners.update(session.execute(
+                        select(URL.short_code, URL.owner_id)
+                        .where(URL.short_code.in_([code for code, _, _ in clicks]), URL.owner_id.isnot(None))
+                    ).all())
+                    session.execute(statement, [
+                        {"b_short_code": code, "b_count": count, "b_last": datetime.utcfromtimestamp(last)}
+                        for code, count, last in clicks
+                    ])
+                    session.commit()
+                except Exception:
+                    session.rollback()
+                    pipe = client.pipeline(transaction=True)
+                    for _, shard_clicks in unwritten:
+                        for code, count, last in shard_clicks:
+                            pipe.hincrby(f"clicks:{code}", "count", count)
+                            pipe.hset(f"clicks:{code}", "last", last)
+                            pipe.sadd(CLICKS_DIRTY_KEY, code)
+                    pipe.execute()
+                    raise
+                unwritten.pop(0)
+            
+            client.unlink(*[f"url:{code}" for code, _, _ in pending])
+            with cache_fallback("owner stats"):
+                owner_stats_service.clicks_flushed(
+                    (owners[code], code, count) for code, count, _ in pending if code in owners
+                )
+            flushed += len(pending)
+    if flushed:
+        logger.info("Flushed clicks for %d links", flushed)
+    return flushed
+
+def get_url_stats(db: Session, short_code: str) -> Optional[URLRecord]:
+    """Get URL statistics, including clicks not yet flushed to the database."""
+    url = get_url_by_short_code(db, short_code)
+    if not url:
+        return None
+    
+    count = last = None
+    with cache_fallback("read"):
+        count, last = redis_client.hmget(f"clicks:{short_code}", "count", "last")
+    return _with_pending_clicks(url, count, last)
+
+def _with_pending_clicks(url: URLRecord, count: Optional[str], last: Optional[str]) -> URLRecord:
+    """Add clicks still buffered in Redis to a URL's counters."""
+    if not count:
+        return url
+    last_accessed_at = datetime.utcfromtimestamp(float(last))
+    if url.last_accessed_at and as_utc(url.last_accessed_at) > as_utc(last_accessed_at):
+        last_accessed_at = url.last_accessed_at
+    return url._replace(
+        access_count=(url.access_count or 0) + int(count),
+        last_accessed_at=last_accessed_at
+    )
+
+def get_url_stats_batch(db: Session, short_codes: List[str]) -> List[Optional[URLRecord]]:
+    """Get statistics for many URLs, in input order (None for unknown codes).
+    
+    Cache entries and pending clicks for every code come from one pipeline
+    per cache node. Misses are loaded with one IN query per BULK_CHUNK_SIZE
+    codes, on their shards in parallel, and written back to the cache in one
+    more pipeline.
+    """
+    codes = list(dict.fromkeys(short_codes))
+    cached = [None] * len(codes)
+    clicks = [(None, None)] * len(codes)
+    with cache_fallback("read"):
+        pipe = redis_client.pipeline()
+        for code in codes:
+            pipe.get(f"url:{code}")
+            pipe.hmget(f"clicks:{code}", "count", "last")
+        results = pipe.execute()
+        cached, clicks = results[::2], results[1::2]
+    
+    found = {}
+    for code, entry in zip(codes, cached):
+        url = _record_from_cache(entry)
+        if url is not None:
+            found[code] = url
+    
+    misses = shard_router.group_by_shard(code for code in codes if code not in found)
+    
+    def load(session: Session, shard: int) -> List[URLRecord]:
+        shard_misses = misses[shard]
+        loaded = []
+        for i in range(0, len(shard_misses), settings.BULK_CHUNK_SIZE):
+            rows = session.execute(
+                select(*URL_RECORD_COLUMNS).where(URL.short_code.in_(shard_misses[i:i + settings.BULK_CHUNK_SIZE]))
+            ).all()
+            loaded.extend(URLRecord._make(row) for row in rows)
+        return loaded
+    
+    loaded = [url for urls in shard_router.scatter(db, load, misses) for url in urls] if misses else []
+    if loaded:
+        with cache_fallback("write"):
+            pipe = redis_client.pipeline()
+            for url in loaded:
+                pipe.setex(f"url:{url.short_code}", 3600, _cache_entry(url))
+            pipe.execute()
+        found.update((url.short_code, url) for url in loaded)
+    
+    pending = dict(zip(codes, clicks))
+    return [
+        _with_pending_clicks(found[code], *pending[code]) if code in found else None
+        for code in short_codes
+    ]
+
+def search_url_by_original(db: Session, original_url: str, user_id: Optional[int] = None) -> Optional[URLRecord]:
+    """Search URL by original URL, on every link shard in parallel."""
     original_url = original_url.rstrip('/')
-    query = db.query(URL).filter(URL.original_url == original_url)
+    query = select(*URL_RECORD_COLUMNS).where(URL.original_url == original_url)
     if user_id is not None:
-        query = query.filter(URL.owner_id == user_id)
-    return query.first()
+        query = query.where(URL.owner_id == user_id)
+    rows = shard_router.scatter(db, lambda session, shard: session.execute(query.limit(1)).first())
+    row = next((row for row in rows if row is not None), None)
+    return URLRecord._make(row) if row else None
 
-def increment_access_count(db: Session, short_code: str) -> None:
-    """Increment access count and update last accessed time."""
-    db_url = db.query(URL).filter(URL.short_code == short_code).first()
-    if db_url:
-        db_url.access_count += 1
-        db_url.last_accessed_at = datetime.utcnow()
-        db.commit()
-        
-        redis_client.delete(f"url:{short_code}") 
\ No newline at end of file
+def _successor(value: str) -> str:
+    """Smallest string greater than every string starting with `value`."""
+    return value[:-1] + chr(ord(value[-1]) + 1)
+
+def search_key_range(domain: Optional[str] = None, prefix: Optional[str] = None) -> Optional[Tuple[str, str]]:
+    """[low, high) range of search keys for a domain (with its subdomains) or
+    a URL prefix; None if the input has no host.
+
+    "example.com" covers the keys starting with "com.example/" and
+    "com.example.", and since "." and "/" are adjacent bytes, so does
+    ["com.example.", "com.example0").
+    """
+    if domain is not None:
+        key = search_key(domain.strip().lower())
+        if key is None:
+            return None
+        host = key.partition("/")[0]
+        return f"{host}.", f"{host}0"
+    key = search_key(prefix.strip())
+    if key is None:
+        return None
+    return key, _successor(key)
+
+def search_urls(
+    db: Session,
+    owner_id: int,
+    key_range: Tuple[str, str],
+    limit: int = 50,
+    after: Optional[Tuple[str, str]] = None
+) -> Tuple[List[URLRecord], Optional[Tuple[str, str]]]:
+    """Page through the owner's links whose search key is in `key_range`.
+
+    Each shard answers with one range scan of the (owner_id, search_key,
+    short_code) index, starting after the `after` keyset; the pages are
+    merged in key order. Returns the links and the keyset to continue
+    after, or None on the last page.
+    """
+    low, high = key_range
+    if after is not None:
+        low = max(low, after[0])
+    
+    def page(session: Session, shard: int) -> list:
+        # Ties on the key are broken by short code bytes, as in the merge below
+        short_code = URL.short_code
+        if session.get_bind().dialect.name == "postgresql":
+            short_code = short_code.collate("C")
+        query = (
+            select(*URL_RECORD_COLUMNS, URL.search_key)
+            .where(URL.owner_id == owner_id, URL.search_key >= low, URL.search_key < high)
+            .order_by(URL.search_key, short_code)
+            .limit(limit + 1)
+        )
+        if after is not None:
+            query = query.where(or_(URL.search_key > after[0], short_code > after[1]))
+        return session.execute(query).all()
+    
+    pages = shard_router.scatter(db, page)
+    rows = list(heapq.merge(*pages, key=lambda row: (row.search_key.encode(), row.short_code.encode())))[:limit + 1]
+    next_after = (rows[limit - 1].search_key, rows[limit - 1].short_code) if len(rows) > limit else None
+    return [URLRecord._make(row[:-1]) for row in rows[:limit]], next_after
+
+def backfill_search_keys(db: Session, batch_size: int = 1000) -> int:
+    """Fill in search_key for links stored before the column existed.
+
+    upgrade_schema adds the column empty, and such links are missing from
+    domain/prefix search until this runs. Every shard is walked in id order,
+    one SELECT and one executemany UPDATE per batch; links whose URL has no
+    host keep NULL. Returns the number of links filled in.
+    """
+    table = URL.__table__
+    statement = update(table).where(table.c.id == bindparam("b_id")).values(search_key=bindparam("b_key"))
+    filled = 0
+    for shard in range(shard_router.count):
+        session = shard_router.session(db, shard)
+        after = 0
+        while True:
+            rows = session.execute(
+                select(URL.id, URL.original_url)
+                .where(URL.search_key.is_(None), URL.id > after)
+                .order_by(URL.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            keys = [{"b_id": row.id, "b_key": search_key(row.original_url)} for row in rows]
+            keys = [key for key in keys if key["b_key"] is not None]
+            if keys:
+                session.execute(statement, keys)
+            session.commit()
+            filled += len(keys)
+            after = rows[-1].id
+    if filled:
+        logger.info("Filled in search keys for %d links", filled)
+    return filled
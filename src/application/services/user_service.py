@@ -1,15 +1,34 @@
 
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
+import hashlib
+import hmac
+import secrets
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from sqlalchemy.orm import Session
 from ..models.models import User
 from ..schemas.user import UserCreate, UserUpdate
 from ..core.config import settings
+from ..db.cache import redis_client
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# Refresh tokens are "<user id>.<token id>.<secret>". Redis keeps only a hash
+# of the secret under refresh:<user id>:<token id>, plus the set of a user's
+# token ids for revoking them all; every key routes to the user's node.
+# KEYS: old token, new token, user's token set
+# ARGV: old secret hash, new secret hash, ttl, old token id, new token id
+REFRESH_ROTATE_SCRIPT = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then return 0 end
+redis.call('DEL', KEYS[1])
+redis.call('SET', KEYS[2], ARGV[2], 'EX', ARGV[3])
+redis.call('SREM', KEYS[3], ARGV[4])
+redis.call('SADD', KEYS[3], ARGV[5])
+redis.call('EXPIRE', KEYS[3], ARGV[3])
+return 1
+"""
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash."""
     return pwd_context.verify(plain_password, hashed_password)
@@ -58,8 +77,89 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm="HS256")
     return encoded_jwt
 
+def _refresh_key(user_id: int, token_id: str) -> str:
+    return f"refresh:{user_id}:{token_id}"
+
+def _refresh_index_key(user_id: int) -> str:
+    return f"refresh:{user_id}:tokens"
+
+def _hash_secret(secret: str) -> str:
+    return hashlib.sha256(secret.encode()).hexdigest()
+
+def _new_refresh_token(user_id: int) -> Tuple[str, str, str]:
+    token_id, secret = secrets.token_hex(8), secrets.token_urlsafe(32)
+    return token_id, secret, f"{user_id}.{token_id}.{secret}"
+
+def _parse_refresh_token(token: str) -> Optional[Tuple[int, str, str]]:
+    parts = token.split(".")
+    if len(parts) != 3 or not parts[0].isdigit() or not parts[1] or not parts[2]:
+        return None
+    return int(parts[0]), parts[1], parts[2]
+
+def create_refresh_token(user_id: int) -> str:
+    """Issue a refresh token valid for REFRESH_TOKEN_EXPIRE_DAYS."""
+    token_id, secret, token = _new_refresh_token(user_id)
+    ttl = timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
+    pipe = redis_client.pipeline(transaction=True)
+    pipe.set(_refresh_key(user_id, token_id), _hash_secret(secret), ex=ttl)
+    pipe.sadd(_refresh_index_key(user_id), token_id)
+    pipe.expire(_refresh_index_key(user_id), ttl)
+    pipe.execute()
+    return token
+
+def rotate_refresh_token(token: str) -> Optional[Tuple[int, str]]:
+    """Swap a refresh token for a new one in a single EVALSHA.
+
+    Returns the user id and the new token, or None if the token is unknown,
+    expired, revoked or was already used.
+    """
+    parsed = _parse_refresh_token(token)
+    if parsed is None:
+        return None
+    user_id, token_id, secret = parsed
+    new_id, new_secret, new_token = _new_refresh_token(user_id)
+    rotated = redis_client.register_script(REFRESH_ROTATE_SCRIPT)(
+        keys=[_refresh_key(user_id, token_id), _refresh_key(user_id, new_id), _refresh_index_key(user_id)],
+        args=[
+            _hash_secret(secret), _hash_secret(new_secret),
+            int(timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS).total_seconds()),
+            token_id, new_id
+        ]
+    )
+    return (user_id, new_token) if rotated else None
+
+def revoke_refresh_token(token: str) -> None:
+    """Revoke a refresh token (e.g. on logout); unknown tokens are ignored."""
+    parsed = _parse_refresh_token(token)
+    if parsed is None:
+        return
+    user_id, token_id, secret = parsed
+    stored = redis_client.get(_refresh_key(user_id, token_id))
+    if stored is not None and hmac.compare_digest(stored, _hash_secret(secret)):
+        redis_client.delete(_refresh_key(user_id, token_id))
+        redis_client.srem(_refresh_index_key(user_id), token_id)
+
+def revoke_user_refresh_tokens(user_id: int) -> None:
+    """Revoke every refresh token of a user."""
+    token_ids = redis_client.smembers(_refresh_index_key(user_id))
+    redis_client.delete(_refresh_index_key(user_id), *[_refresh_key(user_id, token_id) for token_id in token_ids])
+
+def issue_tokens(user_id: int, refresh_token: Optional[str] = None) -> dict:
+    """Access token plus refresh token for a login or a refresh."""
+    expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    return {
+        "access_token": create_access_token(data={"sub": str(user_id)}, expires_delta=expires),
+        "token_type": "bearer",
+        "refresh_token": refresh_token or create_refresh_token(user_id),
+        "expires_in": int(expires.total_seconds())
+    }
+
 def update_user(db: Session, user_id: int, user_update: UserUpdate) -> Optional[User]:
-    """Update user details."""
+    """Update user details.
+
+    A new password revokes every refresh token before the user is touched,
+    so a RedisError from the revocation leaves nothing to undo.
+    """
     db_user = db.query(User).filter(User.id == user_id).first()
     if not db_user:
         return None
@@ -67,10 +167,11 @@ def update_user(db: Session, user_id: int, user_update: UserUpdate) -> Optional[
     update_data = user_update.dict(exclude_unset=True)
     if "password" in update_data:
         update_data["hashed_password"] = get_password_hash(update_data.pop("password"))
+        revoke_user_refresh_tokens(user_id)
     
     for field, value in update_data.items():
         setattr(db_user, field, value)
     
     db.commit()
     db.refresh(db_user)
-    return db_user 
\ No newline at end of file
+    return db_user
\ No newline at end of file
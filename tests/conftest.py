@@ -1,12 +1,14 @@
 import os
 import sys
 from pathlib import Path
+import time
 import uuid
 
 project_root = str(Path(__file__).parent.parent)
 sys.path.insert(0, project_root)
 
 import pytest
+import redis
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker
@@ -138,4 +140,45 @@ def test_url_data():
         "original_url": "https://example.com",
         "custom_alias": unique_alias,
         "expires_at": None
-    } 
\ No newline at end of file
+    } 
+
+@pytest.fixture
+def query_budget():
+    """Assert the maximum number of SQL statements run inside a block."""
+    from src.application.db.instrumentation import assert_max_queries
+    return assert_max_queries
+
+class DownRedis:
+    """Stand-in for an unresponsive cache node: every command times out after `delay`."""
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.calls = 0
+
+    def __getattr__(self, name):
+        def command(*args, **kwargs):
+            self.calls += 1
+            time.sleep(self.delay)
+            raise redis.TimeoutError(f"{name} timed out")
+
+        return command
+
+    def register_script(self, script):
+        return lambda keys, args, client: client.evalsha("sha", len(keys), *keys, *args)
+
+    def pipeline(self, transaction=False):
+        node = self
+
+        class Pipe:
+            def __getattr__(self, name):
+                return lambda *args, **kwargs: self
+
+            def execute(self):
+                return node.execute()
+
+        return Pipe()
+
+@pytest.fixture
+def down_redis():
+    """A cache node whose commands all time out after 50 ms."""
+    return DownRedis(delay=0.05)
@@ -30,6 +30,14 @@ def test_create_short_url_duplicate_alias(authorized_client: TestClient, test_ur
     assert response.status_code == 400
     assert "Custom alias already taken" in response.json()["detail"]
 
+def test_create_short_url_reserved_alias(authorized_client: TestClient):
+    """Test that aliases shadowed by fixed routes are rejected."""
+    for alias in ["trending", "search", "shorten", "stats"]:
+        response = authorized_client.post(
+            "/api/v1/links/shorten", json={"original_url": "https://example.com", "custom_alias": alias}
+        )
+        assert response.status_code == 422
+
 def test_redirect_to_url(authorized_client: TestClient, test_url_data):
     """Test URL redirection."""
     create_response = authorized_client.post("/api/v1/links/shorten", json=test_url_data)
@@ -117,4 +125,422 @@ def test_search_url(authorized_client: TestClient, test_url_data, db):
     assert data["original_url"] == test_url_data["original_url"]
 
     response = authorized_client.get("/api/v1/links/search?original_url=https://non-existent.com")
-    assert response.status_code == 404 
\ No newline at end of file
+    assert response.status_code == 404 
+
+def test_get_url_stats_conditional(authorized_client: TestClient, test_url_data):
+    """Test ETag / Last-Modified revalidation of URL statistics."""
+    authorized_client.post("/api/v1/links/shorten", json=test_url_data)
+    stats_url = f"/api/v1/links/{test_url_data['custom_alias']}/stats"
+    
+    response = authorized_client.get(stats_url)
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    last_modified = response.headers["last-modified"]
+    
+    response = authorized_client.get(stats_url, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    
+    response = authorized_client.get(stats_url, headers={"If-Modified-Since": last_modified})
+    assert response.status_code == 304
+    
+    authorized_client.put(
+        f"/api/v1/links/{test_url_data['custom_alias']}",
+        json={"original_url": "https://updated-example.com"}
+    )
+    response = authorized_client.get(stats_url, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+def test_redirect_cache_headers(authorized_client: TestClient, test_url_data, monkeypatch):
+    """Test configurable redirect status and Cache-Control bounded by expiry."""
+    from src.application.core.config import settings
+    monkeypatch.setattr(settings, "REDIRECT_STATUS_CODE", 301)
+    monkeypatch.setattr(settings, "REDIRECT_CACHE_MAX_AGE", 86400)
+    
+    expires_at = datetime.utcnow() + timedelta(minutes=10)
+    url_data = {**test_url_data, "expires_at": expires_at.isoformat()}
+    authorized_client.post("/api/v1/links/shorten", json=url_data)
+    
+    response = authorized_client.get(f"/api/v1/links/{url_data['custom_alias']}", allow_redirects=False)
+    assert response.status_code == 301
+    cache_control = response.headers["cache-control"]
+    assert cache_control.startswith("public, max-age=")
+    assert 0 < int(cache_control.split("=")[1]) <= 600
+
+def test_get_url_stats_unique_visitors(authorized_client: TestClient, test_url_data):
+    """Test unique visitor estimation on URL statistics."""
+    authorized_client.post("/api/v1/links/shorten", json=test_url_data)
+    short_code = test_url_data["custom_alias"]
+    
+    for user_agent in ["agent-a", "agent-b", "agent-a", "agent-a"]:
+        authorized_client.get(
+            f"/api/v1/links/{short_code}",
+            headers={"User-Agent": user_agent},
+            allow_redirects=False
+        )
+    
+    response = authorized_client.get(f"/api/v1/links/{short_code}/stats")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["access_count"] == 4
+    assert data["unique_visitors"] == 2
+
+def test_get_trending_links(authorized_client: TestClient, test_url_data):
+    """Test trending links endpoint."""
+    authorized_client.post("/api/v1/links/shorten", json=test_url_data)
+    short_code = test_url_data["custom_alias"]
+    for _ in range(3):
+        authorized_client.get(f"/api/v1/links/{short_code}", allow_redirects=False)
+    
+    response = authorized_client.get("/api/v1/links/trending?window=24h&limit=100")
+    assert response.status_code == 200
+    trending = {item["short_code"]: item["score"] for item in response.json()}
+    assert trending[short_code] == pytest.approx(3, rel=0.01)
+    
+    response = authorized_client.get("/api/v1/links/trending?window=2y")
+    assert response.status_code == 422
+
+def test_bulk_delete_urls(authorized_client: TestClient, test_url_data):
+    """Test bulk deletion by code list and by expiry range."""
+    codes = [f"{test_url_data['custom_alias']}-{i}" for i in range(3)]
+    for i, code in enumerate(codes):
+        authorized_client.post("/api/v1/links/shorten", json={
+            "original_url": f"https://example.com/{i}",
+            "custom_alias": code,
+            "expires_at": (datetime.utcnow() + timedelta(days=i + 1)).isoformat()
+        })
+    
+    response = authorized_client.request(
+        "DELETE", "/api/v1/links", json={"short_codes": [codes[0], "non-existent"]}
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["affected"] == 1
+    assert data["results"] == [
+        {"short_code": codes[0], "status": "deleted"},
+        {"short_code": "non-existent", "status": "not_found"}
+    ]
+    assert authorized_client.get(f"/api/v1/links/{codes[0]}").status_code == 404
+    
+    response = authorized_client.request(
+        "DELETE", "/api/v1/links",
+        json={"expires_before": (datetime.utcnow() + timedelta(days=2, hours=12)).isoformat()}
+    )
+    assert response.json()["results"] == [{"short_code": codes[1], "status": "deleted"}]
+    assert authorized_client.get(f"/api/v1/links/{codes[2]}", allow_redirects=False).status_code == 307
+    
+    response = authorized_client.request("DELETE", "/api/v1/links", json={})
+    assert response.status_code == 422
+
+def test_bulk_update_urls(authorized_client: TestClient, test_url_data):
+    """Test bulk update invalidates cached redirects."""
+    codes = [f"{test_url_data['custom_alias']}-{i}" for i in range(2)]
+    for code in codes:
+        authorized_client.post("/api/v1/links/shorten", json={"original_url": f"https://example.com/{code}", "custom_alias": code})
+        authorized_client.get(f"/api/v1/links/{code}", allow_redirects=False)
+    
+    response = authorized_client.patch("/api/v1/links", json={
+        "short_codes": codes,
+        "update": {"original_url": "https://updated-example.com"}
+    })
+    assert response.status_code == 200
+    assert response.json()["affected"] == 2
+    for code in codes:
+        response = authorized_client.get(f"/api/v1/links/{code}", allow_redirects=False)
+        assert response.headers["location"] == "https://updated-example.com"
+
+def test_query_budgets(authorized_client: TestClient, test_url_data, query_budget):
+    """Test per-endpoint SQL statement budgets."""
+    short_code = test_url_data["custom_alias"]
+    
+    with query_budget(2):  # user lookup + INSERT ... RETURNING
+        response = authorized_client.post("/api/v1/links/shorten", json=test_url_data)
+    assert response.status_code == 200
+    
+    with query_budget(0):
+        response = authorized_client.get(f"/api/v1/links/{short_code}", allow_redirects=False)
+    assert response.status_code == 307
+    assert response.headers["x-db-queries"] == "0"
+    
+    with query_budget(0):
+        response = authorized_client.get(f"/api/v1/links/{short_code}/stats")
+    assert response.status_code == 200
+    
+    with query_budget(3):  # user lookup + SELECT + DELETE
+        response = authorized_client.delete(f"/api/v1/links/{short_code}")
+    assert response.status_code == 200
+
+def test_get_url_stats_reports_real_id(authorized_client: TestClient, test_url_data, db):
+    """Test that cached stats carry the link's database id."""
+    for i in range(2):
+        authorized_client.post("/api/v1/links/shorten", json={"original_url": f"https://example.com/{i}"})
+    authorized_client.post("/api/v1/links/shorten", json=test_url_data)
+    from src.application.models.models import URL
+    url = db.query(URL).filter(URL.short_code == test_url_data["custom_alias"]).first()
+    
+    response = authorized_client.get(f"/api/v1/links/{test_url_data['custom_alias']}/stats")
+    assert response.json()["id"] == url.id
+
+def test_metrics(client: TestClient):
+    """Test that process metrics are exposed."""
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert set(response.json()) == {"counters", "gauges"}
+
+async def _asgi_get(path: str) -> tuple:
+    """GET `path` straight through the ASGI app; return (status, seconds until
+    the response started). TestClient only returns once the app has finished,
+    including handlers abandoned in the threadpool."""
+    import time
+    from src.application.main import app
+    
+    sent = []
+    requests = iter([{"type": "http.request", "body": b"", "more_body": False}])
+    
+    async def receive():
+        return next(requests, {"type": "http.disconnect"})
+    
+    async def send(message):
+        sent.append((time.perf_counter(), message))
+    
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": path,
+        "raw_path": path.encode(), "root_path": "", "query_string": b"",
+        "headers": [], "client": ("testclient", 50000), "server": ("testserver", 80)
+    }
+    start = time.perf_counter()
+    await app(scope, receive, send)
+    sent_at, message = sent[0]
+    return message["status"], sent_at - start
+
+def _timed_get(path: str) -> tuple:
+    import asyncio
+    return asyncio.run(_asgi_get(path))
+
+def test_request_deadline(db, monkeypatch):
+    """Test that requests past their route deadline get a 504 without waiting."""
+    import time
+    from sqlalchemy import text
+    from src.application.core import deadline
+    from src.application.core.config import settings
+    from src.application.services import url_service
+    
+    monkeypatch.setitem(settings.ROUTE_DEADLINES_MS, "GET /api/v1/links/{short_code}/stats", 50.0)
+    monkeypatch.setattr(url_service, "get_url_stats", lambda db, short_code: time.sleep(0.5))
+    status, elapsed = _timed_get("/api/v1/links/slow/stats")
+    assert status == 504
+    assert elapsed < 0.4
+    
+    # Once the deadline has passed, new transactions are refused
+    db.rollback()
+    with deadline.scope(0), pytest.raises(deadline.DeadlineExceeded):
+        db.execute(text("SELECT 1"))
+
+def test_read_users_me_stats(authorized_client: TestClient):
+    """Test the current user's link summary."""
+    for i in range(2):
+        authorized_client.post("/api/v1/links/shorten", json={"original_url": f"https://example.com/mine/{i}"})
+    
+    response = authorized_client.get("/api/v1/users/me/stats", params={"top": 1})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["total_links"] == data["active_links"] == 2
+    assert data["expired_links"] == 0
+    assert len(data["top_links"]) == 1
+    
+    response = authorized_client.get("/api/v1/users/me/stats", params={"top": 0})
+    assert response.status_code == 422
+
+def test_shorten_idempotency_key(authorized_client: TestClient, query_budget):
+    """Test that retried shorten requests replay the first response from Redis."""
+    import uuid
+    headers = {"Idempotency-Key": uuid.uuid4().hex}
+    payload = {"original_url": "https://example.com/retried"}
+    first = authorized_client.post("/api/v1/links/shorten", json=payload, headers=headers)
+    assert first.status_code == 200
+    assert "idempotent-replayed" not in first.headers
+    
+    with query_budget(0):
+        retry = authorized_client.post("/api/v1/links/shorten", json=payload, headers=headers)
+    assert retry.status_code == 200
+    assert retry.json() == first.json()
+    assert retry.headers["idempotent-replayed"] == "true"
+    
+    response = authorized_client.post(
+        "/api/v1/links/shorten", json={"original_url": "https://example.com/other"}, headers=headers
+    )
+    assert response.status_code == 422
+
+def test_refresh_token_rotation(client: TestClient, test_user, query_budget):
+    """Test that refresh tokens mint access tokens without a login and rotate on use."""
+    response = client.post(
+        "/api/v1/users/login", data={"username": "test@example.com", "password": "testpassword"}
+    )
+    assert response.status_code == 200
+    tokens = response.json()
+    assert tokens["expires_in"] == 15 * 60
+    
+    with query_budget(0):
+        response = client.post("/api/v1/users/token/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert response.status_code == 200
+    refreshed = response.json()
+    assert refreshed["refresh_token"] != tokens["refresh_token"]
+    response = client.get("/api/v1/users/me", headers={"Authorization": f"Bearer {refreshed['access_token']}"})
+    assert response.json()["id"] == test_user.id
+    
+    # A refresh token works once
+    response = client.post("/api/v1/users/token/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert response.status_code == 401
+    
+    client.post("/api/v1/users/token/revoke", json={"refresh_token": refreshed["refresh_token"]})
+    response = client.post("/api/v1/users/token/refresh", json={"refresh_token": refreshed["refresh_token"]})
+    assert response.status_code == 401
+
+def test_password_change_revokes_refresh_tokens(authorized_client: TestClient, test_user):
+    """Test that changing the password logs out every refresh token."""
+    from src.application.services import user_service
+    refresh_token = user_service.create_refresh_token(test_user.id)
+    
+    response = authorized_client.put("/api/v1/users/me", json={"password": "newpassword"})
+    assert response.status_code == 200
+    response = authorized_client.post("/api/v1/users/token/refresh", json={"refresh_token": refresh_token})
+    assert response.status_code == 401
+
+def test_password_change_fails_closed_without_redis(authorized_client: TestClient, test_user, db, monkeypatch):
+    """Test that a password change which cannot revoke refresh tokens changes nothing."""
+    import redis
+    from src.application.services import user_service
+    
+    def redis_down(*args, **kwargs):
+        raise redis.ConnectionError("down")
+    
+    monkeypatch.setattr(user_service, "revoke_user_refresh_tokens", redis_down)
+    monkeypatch.setattr(user_service, "revoke_refresh_token", redis_down)
+    old_hash = test_user.hashed_password
+    
+    response = authorized_client.put("/api/v1/users/me", json={"password": "newpassword"})
+    assert response.status_code == 503
+    db.expire_all()
+    assert test_user.hashed_password == old_hash
+    
+    response = authorized_client.post("/api/v1/users/token/revoke", json={"refresh_token": "1.abc"})
+    assert response.status_code == 503
+
+def test_get_url_stats_batch(client: TestClient, authorized_client: TestClient, test_url_data):
+    """Test batch stats with not-found markers in request order."""
+    authorized_client.post("/api/v1/links/shorten", json=test_url_data)
+    alias = test_url_data["custom_alias"]
+    
+    response = client.post("/api/v1/links/stats/batch", json={"short_codes": ["nope", alias]})
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [(item["short_code"], item["found"]) for item in results] == [("nope", False), (alias, True)]
+    assert results[0]["stats"] is None
+    assert results[1]["stats"]["original_url"] == test_url_data["original_url"].rstrip("/")
+    
+    response = client.post("/api/v1/links/stats/batch", json={"short_codes": []})
+    assert response.status_code == 422
+
+def test_search_urls_by_domain(authorized_client: TestClient):
+    """Test paged domain search and its parameter checks."""
+    for path in ["a", "b", "c"]:
+        authorized_client.post("/api/v1/links/shorten", json={"original_url": f"https://shop.example.com/{path}"})
+    authorized_client.post("/api/v1/links/shorten", json={"original_url": "https://example.net/a"})
+    
+    response = authorized_client.get("/api/v1/links/search", params={"domain": "example.com", "limit": 2})
+    assert response.status_code == 200
+    page = response.json()
+    assert [item["original_url"] for item in page["items"]] == [
+        "https://shop.example.com/a", "https://shop.example.com/b"
+    ]
+    response = authorized_client.get(
+        "/api/v1/links/search", params={"domain": "example.com", "limit": 2, "cursor": page["next_cursor"]}
+    )
+    page = response.json()
+    assert [item["original_url"] for item in page["items"]] == ["https://shop.example.com/c"]
+    assert page["next_cursor"] is None
+    
+    response = authorized_client.get("/api/v1/links/search", params={"prefix": "shop.example.com/b"})
+    assert [item["original_url"] for item in response.json()["items"]] == ["https://shop.example.com/b"]
+    
+    assert authorized_client.get("/api/v1/links/search").status_code == 422
+    assert authorized_client.get("/api/v1/links/search", params={"domain": "x.com", "prefix": "x.com"}).status_code == 422
+    assert authorized_client.get("/api/v1/links/search", params={"domain": "x.com", "cursor": "!!"}).status_code == 422
+
+def test_load_shedding(client: TestClient, authorized_client: TestClient, test_url_data, monkeypatch):
+    """Test that overload sheds low priority routes with 503 but keeps redirects."""
+    from src.application.core.admission import admission_controller
+    authorized_client.post("/api/v1/links/shorten", json=test_url_data)
+    alias = test_url_data["custom_alias"]
+    
+    monkeypatch.setattr(admission_controller, "queue_wait", admission_controller.target_queue_wait * 2)
+    response = authorized_client.get(f"/api/v1/links/{alias}/stats")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    assert authorized_client.get("/api/v1/links/search", params={"domain": "example.com"}).status_code == 503
+    assert authorized_client.get("/api/v1/users/me").status_code == 200
+    
+    monkeypatch.setattr(admission_controller, "queue_wait", 10.0)
+    assert authorized_client.get("/api/v1/users/me").status_code == 503
+    assert client.get(f"/api/v1/links/{alias}", follow_redirects=False).status_code == 307
+    
+    counters = client.get("/metrics").json()["counters"]
+    assert counters["requests.shed.low"] >= 2
+    assert counters["requests.shed.normal"] >= 1
+    assert admission_controller.in_flight == 0
+
+def test_slow_redirect_hits_its_deadline(db, monkeypatch):
+    """Test that a redirect stuck on Redis or the database gets a 504 in time."""
+    import time
+    from src.application.core.config import settings
+    from src.application.services import url_service
+    
+    monkeypatch.setitem(settings.ROUTE_DEADLINES_MS, "GET /api/v1/links/{short_code}", 50.0)
+    monkeypatch.setattr(url_service, "resolve_redirect", lambda db, short_code: time.sleep(0.5))
+    status, elapsed = _timed_get("/api/v1/links/slow")
+    assert status == 504
+    assert elapsed < 0.4
+
+def test_saturated_pool_sheds_low_priority_but_serves_redirects(authorized_client: TestClient, test_url_data, monkeypatch):
+    """Test that with every unreserved worker busy, low priority requests get
+    503 while redirects are still served."""
+    import asyncio
+    import time
+    from starlette.concurrency import run_in_threadpool
+    from src.application.core import admission
+    
+    authorized_client.post("/api/v1/links/shorten", json=test_url_data)
+    alias = test_url_data["custom_alias"]
+    monkeypatch.setattr(admission.admission_controller, "reserved_threads", 2)
+    
+    async def run():
+        admission.set_threadpool_size(4)
+        busy = [asyncio.ensure_future(run_in_threadpool(time.sleep, 0.5)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        results = []
+        for _ in range(3):
+            results.append(await _asgi_get(f"/api/v1/links/{alias}/stats"))
+            results.append(await _asgi_get(f"/api/v1/links/{alias}"))
+        await asyncio.gather(*busy)
+        return results
+    
+    results = asyncio.run(run())
+    assert [status for status, _ in results] == [503, 307] * 3
+    assert all(elapsed < 0.4 for _, elapsed in results)
+
+def test_shorten_idempotency_key_in_progress(authorized_client: TestClient, test_user):
+    """Test that a duplicate of a running request gets 409 without waiting for it."""
+    import uuid
+    from src.application.db.cache import redis_client
+    key = uuid.uuid4().hex
+    redis_client.set(f"idem:{test_user.id}:{key}:lock", "first", px=60000)
+    
+    response = authorized_client.post(
+        "/api/v1/links/shorten",
+        json={"original_url": "https://example.com/in-progress"},
+        headers={"Idempotency-Key": key}
+    )
+    assert response.status_code == 409
+    assert response.headers["retry-after"] == "1"
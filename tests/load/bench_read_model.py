@@ -0,0 +1,76 @@
+"""Allocation and latency of building cache-hit results.
+
+Runs without any services:
+
+    python tests/load/bench_read_model.py
+
+Compares decoding a cached payload into a transient SQLAlchemy URL (the old
+cache-hit result) with decoding it into a URLRecord named tuple.
+"""
+import json
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+for name in ["POSTGRES_SERVER", "POSTGRES_USER", "POSTGRES_PASSWORD", "POSTGRES_DB", "REDIS_HOST"]:
+    os.environ.setdefault(name, "localhost")
+
+from src.application.models.models import URL
+from src.application.models.records import URLRecord
+
+ITERATIONS = 20000
+
+PAYLOAD = json.dumps({
+    "id": 42,
+    "original_url": "https://example.com/some/long/path?with=query",
+    "short_code": "abc123",
+    "custom_alias": None,
+    "owner_id": 1,
+    "access_count": 1234,
+    "last_accessed_at": datetime.utcnow().isoformat(),
+    "created_at": datetime.utcnow().isoformat(),
+    "updated_at": None,
+    "expires_at": None,
+    "expires_ts": None
+})
+
+
+def orm_instance(data):
+    return URL(
+        id=data["id"],
+        original_url=data["original_url"],
+        short_code=data["short_code"],
+        custom_alias=data.get("custom_alias"),
+        expires_at=datetime.fromisoformat(data["expires_at"]) if data["expires_at"] else None,
+        owner_id=data["owner_id"],
+        access_count=data["access_count"],
+        last_accessed_at=datetime.fromisoformat(data["last_accessed_at"]) if data["last_accessed_at"] else None,
+        created_at=datetime.fromisoformat(data["created_at"]),
+        updated_at=datetime.fromisoformat(data["updated_at"]) if data.get("updated_at") else None
+    )
+
+
+def measure(name, build):
+    build(json.loads(PAYLOAD))
+
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        build(json.loads(PAYLOAD))
+    elapsed = (time.perf_counter() - start) / ITERATIONS * 1e6
+
+    tracemalloc.start()
+    keep = [build(json.loads(PAYLOAD)) for _ in range(1000)]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del keep
+
+    print(f"{name:>10}: {elapsed:6.2f}us per hit, {size / 1000:7.0f} bytes retained per result")
+
+
+if __name__ == "__main__":
+    measure("orm", orm_instance)
+    measure("record", URLRecord.from_cache)
@@ -0,0 +1,71 @@
+"""Latency comparison of the cached redirect paths.
+
+Run against the compose stack (needs Redis and the POSTGRES_*/REDIS_* env):
+
+    docker-compose run test python tests/load/bench_redirect.py
+
+"two-step" is the previous cache-hit path: GET + JSON decode + expiry check
+in Python, then a separate pipeline to count the click. "lua" is
+url_service.resolve_redirect, which does all of it in one EVALSHA.
+"""
+import statistics
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from unittest.mock import Mock
+
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from sqlalchemy.orm import Session
+from src.application.models.models import URL
+from src.application.services import url_service
+
+ITERATIONS = 5000
+
+
+def two_step(db, short_code):
+    url = url_service.get_url_by_short_code(db, short_code)
+    if url.expires_at is None or url.expires_at > datetime.utcnow():
+        url_service.record_click(short_code)
+    return url
+
+
+def measure(name, func, db, short_code):
+    samples = []
+    for _ in range(ITERATIONS):
+        start = time.perf_counter()
+        func(db, short_code)
+        samples.append((time.perf_counter() - start) * 1e6)
+    samples.sort()
+    print(
+        f"{name:>10}: mean {statistics.mean(samples):8.1f}us  "
+        f"p50 {samples[len(samples) // 2]:8.1f}us  "
+        f"p99 {samples[int(len(samples) * 0.99)]:8.1f}us"
+    )
+
+
+def main():
+    short_code = "bench-redirect"
+    url_service._cache_url(URL(
+        id=0,
+        original_url="https://example.com/bench",
+        short_code=short_code,
+        created_at=datetime.utcnow(),
+        access_count=0
+    ))
+    # Cache hits never touch the session; a mock proves it
+    db = Mock(spec=Session)
+    try:
+        for name, func in [("two-step", two_step), ("lua", url_service.resolve_redirect)]:
+            func(db, short_code)
+            measure(name, func, db, short_code)
+        assert not db.method_calls
+    finally:
+        client = url_service.redis_client.get_client(f"clicks:{short_code}")
+        client.srem(url_service.CLICKS_DIRTY_KEY, short_code)
+        url_service.redis_client.delete(f"url:{short_code}", f"clicks:{short_code}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Lookup latency of the memory-mapped redirect snapshot.
+
+Runs without any services:
+
+    python tests/load/bench_snapshot.py [links]
+
+Writes a snapshot with `links` entries (default 1,000,000) to a temporary
+directory and times random hits and misses through RedirectSnapshot.lookup,
+the call the redirect path makes when the database is down.
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+for name in ["POSTGRES_SERVER", "POSTGRES_USER", "POSTGRES_PASSWORD", "POSTGRES_DB", "REDIS_HOST"]:
+    os.environ.setdefault(name, "localhost")
+
+from src.application.db.snapshot import BASE_NAME, RedirectSnapshot, write_snapshot
+
+ITERATIONS = 20000
+
+
+def main():
+    links = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    codes = sorted(f"{i:08x}" for i in range(links))
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        write_snapshot(
+            Path(directory) / BASE_NAME,
+            ((code, f"https://example.com/articles/{code}", None) for code in codes),
+            time.time()
+        )
+        size = os.path.getsize(Path(directory) / BASE_NAME)
+        print(f"built {links} links in {time.perf_counter() - start:.1f}s, {size / 1e6:.1f} MB")
+
+        snapshot = RedirectSnapshot(directory)
+        for name, keys in [("hit", random.choices(codes, k=ITERATIONS)), ("miss", ["zz"] * ITERATIONS)]:
+            samples = []
+            for key in keys:
+                start = time.perf_counter()
+                snapshot.lookup(key)
+                samples.append((time.perf_counter() - start) * 1e6)
+            samples.sort()
+            print(
+                f"{name:>5}: mean {statistics.mean(samples):6.1f}us  "
+                f"p50 {samples[len(samples) // 2]:6.1f}us  "
+                f"p99 {samples[int(len(samples) * 0.99)]:6.1f}us"
+            )
+
+
+if __name__ == "__main__":
+    main()
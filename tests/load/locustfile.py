@@ -21,9 +21,20 @@ class URLShortenerUser(HttpUser):
             "password": self.password
         }
         response = self.client.post("/api/v1/users/login", data=login_data)
-        self.token = response.json()["access_token"]
+        self._use_tokens(response.json())
+    
+    def _use_tokens(self, tokens):
+        self.token = tokens["access_token"]
+        self.refresh_token = tokens["refresh_token"]
         self.client.headers = {"Authorization": f"Bearer {self.token}"}
     
+    @task(1)
+    def refresh_access_token(self):
+        """Renew the short-lived access token, as clients do instead of logging in again."""
+        response = self.client.post("/api/v1/users/token/refresh", json={"refresh_token": self.refresh_token})
+        if response.status_code == 200:
+            self._use_tokens(response.json())
+    
     @task(3)
     def create_short_url(self):
         """Create a new short URL."""
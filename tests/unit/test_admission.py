@@ -0,0 +1,67 @@
+import asyncio
+import pytest
+import time
+
+from src.application.core.admission import AdmissionController, Priority, probe_queue_wait, set_threadpool_size
+from src.application.core.metrics import metrics
+
+
+def test_low_priority_is_shed_first():
+    """Test that rising queue wait sheds low, then normal, never high priority."""
+    controller = AdmissionController(target_queue_wait=0.05, max_in_flight=100, smoothing=1.0)
+    assert all(controller.try_admit(priority) for priority in Priority)
+
+    controller.observe_queue_wait(0.1)
+    assert not controller.try_admit(Priority.LOW)
+    assert controller.try_admit(Priority.NORMAL)
+    assert controller.try_admit(Priority.HIGH)
+
+    controller.observe_queue_wait(0.5)
+    assert not controller.try_admit(Priority.NORMAL)
+    assert controller.try_admit(Priority.HIGH)
+
+    controller.observe_queue_wait(0.0)
+    assert controller.try_admit(Priority.LOW)
+    assert controller.in_flight == 7
+    assert metrics.snapshot()["counters"]["requests.shed.low"] >= 1
+
+
+def test_in_flight_cap_applies_to_every_priority():
+    """Test that nothing is admitted past max_in_flight until requests finish."""
+    controller = AdmissionController(target_queue_wait=0.05, max_in_flight=2)
+    assert controller.try_admit(Priority.HIGH)
+    assert controller.try_admit(Priority.LOW)
+    assert not controller.try_admit(Priority.HIGH)
+    controller.release()
+    assert controller.try_admit(Priority.HIGH)
+
+
+def test_reserved_threads_are_left_to_high_priority():
+    """Test that low, then normal requests are shed as idle workers run out."""
+    controller = AdmissionController(target_queue_wait=0.05, max_in_flight=100, reserved_threads=4)
+    assert controller.try_admit(Priority.LOW, free_threads=5)
+    assert not controller.try_admit(Priority.LOW, free_threads=4)
+    assert controller.try_admit(Priority.NORMAL, free_threads=3)
+    assert not controller.try_admit(Priority.NORMAL, free_threads=2)
+    assert controller.try_admit(Priority.HIGH, free_threads=0)
+
+
+def test_probe_measures_threadpool_queue_wait():
+    """Test that the probe sees work queued behind busy worker threads."""
+    controller = AdmissionController(target_queue_wait=0.05, max_in_flight=100, smoothing=1.0)
+
+    async def run():
+        from starlette.concurrency import run_in_threadpool
+        set_threadpool_size(1)
+        busy = asyncio.ensure_future(run_in_threadpool(time.sleep, 0.2))
+        await asyncio.sleep(0.01)
+        probe = asyncio.ensure_future(probe_queue_wait(controller, interval=10))
+        await busy
+        await asyncio.sleep(0.01)
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+    asyncio.run(run())
+    assert controller.queue_wait >= 0.15
+    assert not controller.try_admit(Priority.LOW)
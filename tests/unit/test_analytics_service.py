@@ -0,0 +1,69 @@
+import pytest
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from src.application.db.cache import redis_client
+from src.application.services import analytics_service
+from src.application.services.analytics_service import (
+    TRENDING_EPOCH_HALF_LIVES,
+    TRENDING_HALF_LIVES,
+    record_redirect,
+    top_trending,
+)
+
+START = datetime(2001, 1, 1)
+START_TS = START.replace(tzinfo=timezone.utc).timestamp()
+
+
+@pytest.fixture
+def clean_trending():
+    def _cleanup():
+        keys = []
+        for window, half_life in TRENDING_HALF_LIVES.items():
+            period = half_life * TRENDING_EPOCH_HALF_LIVES
+            base = analytics_service._trending_epoch(half_life, START_TS)
+            for epoch in range(base - period, base + 3 * period, period):
+                key = analytics_service._trending_key(window, epoch)
+                keys += [key, f"{key}:carried"]
+        redis_client.delete(*keys)
+    _cleanup()
+    yield
+    _cleanup()
+
+
+def _code():
+    return f"t-{uuid.uuid4().hex[:8]}"
+
+
+def test_trending_prefers_recent_clicks(clean_trending):
+    """Test that the short window ranks recent clicks above older bulk traffic."""
+    old, new = _code(), _code()
+    for _ in range(10):
+        record_redirect(old, "1.1.1.1", "agent", now=START)
+    for _ in range(3):
+        record_redirect(new, "1.1.1.1", "agent", now=START + timedelta(hours=5))
+
+    now = START + timedelta(hours=5)
+    hourly = top_trending("1h", 2, now=now)
+    assert [code for code, _ in hourly] == [new, old]
+    assert hourly[0][1] == pytest.approx(3)
+    assert hourly[1][1] == pytest.approx(10 / 2 ** 5)
+
+    weekly = top_trending("7d", 2, now=now)
+    assert [code for code, _ in weekly] == [old, new]
+
+
+def test_trending_carries_scores_across_epochs(clean_trending):
+    """Test that scores are rescaled into a new epoch without losing history."""
+    half_life = TRENDING_HALF_LIVES["1h"]
+    epoch = analytics_service._trending_epoch(half_life, START_TS)
+    boundary = datetime.utcfromtimestamp(epoch + half_life * TRENDING_EPOCH_HALF_LIVES)
+    before, after = _code(), _code()
+
+    for _ in range(8):
+        record_redirect(before, "1.1.1.1", "agent", now=boundary - timedelta(hours=1))
+    record_redirect(after, "1.1.1.1", "agent", now=boundary + timedelta(minutes=1))
+
+    trending = dict(top_trending("1h", 10, now=boundary + timedelta(hours=1)))
+    assert trending[before] == pytest.approx(8 / 2 ** 2)
+    assert trending[after] == pytest.approx(2 ** (-59 / 60))
@@ -0,0 +1,215 @@
+import pytest
+import time
+import redis
+from collections import Counter
+
+from src.application.db.cache import (
+    CacheUnavailableError, CircuitBreaker, HashRing, ShardedRedis, routing_key
+)
+
+
+class StandInRedis:
+    """Dict-backed stand-in for one Redis node that records the calls it gets."""
+
+    def __init__(self):
+        self.data = {}
+        self.calls = []
+
+    def get(self, key):
+        self.calls.append(("get", key))
+        return self.data.get(key)
+
+    def setex(self, key, ttl, value):
+        self.calls.append(("setex", key))
+        self.data[key] = value
+        return True
+
+    def mget(self, keys):
+        self.calls.append(("mget", tuple(keys)))
+        return [self.data.get(key) for key in keys]
+
+    def unlink(self, *keys):
+        self.calls.append(("unlink", keys))
+        return sum(self.data.pop(key, None) is not None for key in keys)
+
+    def pipeline(self, transaction=False):
+        node = self
+
+        class Pipe:
+            def __init__(self):
+                self.queued = []
+
+            def __getattr__(self, name):
+                return lambda *args, **kwargs: self.queued.append((name, args, kwargs))
+
+            def execute(self):
+                node.calls.append(("pipeline", len(self.queued)))
+                return [getattr(node, name)(*args, **kwargs) for name, args, kwargs in self.queued]
+
+        return Pipe()
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _nodes(count):
+    return {f"node-{i}": StandInRedis() for i in range(count)}
+
+
+def test_routing_key():
+    """Test that per-link keys share a routing key."""
+    assert routing_key("url:abc123") == "abc123"
+    assert routing_key("clicks:abc123") == "abc123"
+    assert routing_key("hll:abc123:20240101") == "abc123"
+    assert routing_key("plain") == "plain"
+
+
+def test_hash_ring_distribution():
+    """Test that keys spread evenly over the ring."""
+    ring = HashRing([f"node-{i}" for i in range(4)])
+    counts = Counter(ring.get_node(f"url:code{i}") for i in range(20000))
+
+    assert set(counts) == set(ring.nodes)
+    for count in counts.values():
+        assert 20000 / 4 * 0.75 < count < 20000 / 4 * 1.25
+
+
+def test_hash_ring_minimal_rebalance():
+    """Test that adding or removing a node only moves that node's share."""
+    keys = [f"url:code{i}" for i in range(20000)]
+    ring = HashRing([f"node-{i}" for i in range(4)])
+    before = {key: ring.get_node(key) for key in keys}
+
+    ring.add_node("node-4")
+    after = {key: ring.get_node(key) for key in keys}
+    moved = [key for key in keys if before[key] != after[key]]
+    assert all(after[key] == "node-4" for key in moved)
+    assert len(moved) < len(keys) * 0.3
+
+    ring.remove_node("node-4")
+    assert {key: ring.get_node(key) for key in keys} == before
+
+
+def test_sharded_redis_routes_and_groups_per_node():
+    """Test single-key routing and per-node grouping of multi-key operations."""
+    nodes = _nodes(3)
+    client = ShardedRedis(nodes)
+    keys = [f"url:code{i}" for i in range(300)]
+
+    for key in keys:
+        client.setex(key, 3600, key.upper())
+    for key in keys:
+        assert nodes[client.ring.get_node(key)].data[key] == key.upper()
+    assert all(node.data for node in nodes.values())
+
+    for node in nodes.values():
+        node.calls.clear()
+    assert client.mget(keys + ["url:missing"]) == [key.upper() for key in keys] + [None]
+    for node in nodes.values():
+        assert [call[0] for call in node.calls] == ["mget"]
+
+    pipe = client.pipeline()
+    for key in keys:
+        pipe.get(key)
+    assert pipe.execute() == [key.upper() for key in keys]
+    for node in nodes.values():
+        assert [call for call in node.calls if call[0] == "pipeline"] == [("pipeline", len(node.data))]
+
+    assert client.unlink(*keys) == len(keys)
+    assert not any(node.data for node in nodes.values())
+
+
+def test_sharded_redis_colocates_link_keys():
+    """Test that every key of one link lives on the same node."""
+    client = ShardedRedis(_nodes(5))
+    for i in range(100):
+        code = f"code{i}"
+        assert client.ring.get_node(f"url:{code}") == client.ring.get_node(f"clicks:{code}")
+
+
+def test_circuit_breaker_fails_fast_while_open(down_redis):
+    """Test that an open breaker stops calling a timed-out node."""
+    node = down_redis
+    client = ShardedRedis(
+        {"node-0": node},
+        breaker_factory=lambda name: CircuitBreaker(name, failure_threshold=3, reset_timeout=60)
+    )
+    for _ in range(3):
+        with pytest.raises(redis.TimeoutError):
+            client.get("url:abc")
+    
+    start = time.perf_counter()
+    for _ in range(100):
+        with pytest.raises(CacheUnavailableError):
+            client.get("url:abc")
+        with pytest.raises(CacheUnavailableError):
+            client.register_script("return 1")(keys=["url:abc"])
+    assert time.perf_counter() - start < node.delay
+    assert node.calls == 3
+
+
+def test_circuit_breaker_half_open_probe():
+    """Test that one probe goes through after the cool-down and decides the state."""
+    clock = FakeClock()
+    breaker = CircuitBreaker("node-0", failure_threshold=1, reset_timeout=5, clock=clock)
+    
+    def fail():
+        raise redis.ConnectionError("refused")
+    
+    with pytest.raises(redis.ConnectionError):
+        breaker.call(fail)
+    assert breaker.state == CircuitBreaker.OPEN
+    
+    clock.now = 5
+    with pytest.raises(redis.ConnectionError):
+        breaker.call(fail)
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CacheUnavailableError):
+        breaker.call(lambda: "ok")
+    
+    clock.now = 10
+    breaker.before_call()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    with pytest.raises(CacheUnavailableError):
+        breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.call(lambda: "ok") == "ok"
+
+
+def test_circuit_breaker_ignores_command_errors():
+    """Test that errors from a responsive node do not open the breaker."""
+    breaker = CircuitBreaker("node-0", failure_threshold=1)
+    
+    def wrong_type():
+        raise redis.ResponseError("WRONGTYPE")
+    
+    for _ in range(3):
+        with pytest.raises(redis.ResponseError):
+            breaker.call(wrong_type)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_circuit_breaker_ignores_errors_outside_redis():
+    """Test that a probe interrupted before reaching Redis neither closes nor opens the breaker."""
+    clock = FakeClock()
+    breaker = CircuitBreaker("node-0", failure_threshold=1, reset_timeout=5, clock=clock)
+    
+    def raise_(error):
+        raise error
+    
+    with pytest.raises(redis.TimeoutError):
+        breaker.call(raise_, redis.TimeoutError("timed out"))
+    
+    clock.now = 5
+    for error in (KeyboardInterrupt(), TypeError("bad argument")):
+        with pytest.raises(type(error)):
+            breaker.call(raise_, error)
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.call(lambda: "ok") == "ok"
+    assert breaker.state == CircuitBreaker.CLOSED
@@ -0,0 +1,84 @@
+import pytest
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException, Response
+
+from src.application.core import idempotency
+from src.application.core.config import settings
+from src.application.db.cache import redis_client
+
+
+def _key():
+    return f"test-{uuid.uuid4().hex}"
+
+
+def test_duplicates_get_409_while_the_first_runs():
+    """Test that a duplicate mid-request gets 409 at once and the stored response afterwards."""
+    key, calls, running, finish = _key(), [], threading.Event(), threading.Event()
+    
+    def handler():
+        calls.append(1)
+        running.set()
+        finish.wait(5)
+        return {"short_url": "/1"}
+    
+    with ThreadPoolExecutor(1) as pool:
+        first = pool.submit(idempotency.execute, 1, key, "same", Response(), handler)
+        running.wait(5)
+        start = time.monotonic()
+        with pytest.raises(HTTPException) as exc_info:
+            idempotency.execute(1, key, "same", Response(), handler)
+        assert exc_info.value.status_code == 409
+        assert exc_info.value.headers == {"Retry-After": "1"}
+        assert time.monotonic() - start < 0.1
+        finish.set()
+        assert first.result() == {"short_url": "/1"}
+    
+    response = Response()
+    assert idempotency.execute(1, key, "same", response, handler) == {"short_url": "/1"}
+    assert response.headers[idempotency.REPLAYED_HEADER] == "true"
+    assert len(calls) == 1
+
+
+def test_lock_is_kept_while_the_handler_runs(monkeypatch):
+    """Test that a handler running past the lock TTL still keeps duplicates out."""
+    monkeypatch.setattr(settings, "IDEMPOTENCY_LOCK_TTL", 0.15)
+    key, calls = _key(), []
+    
+    def handler():
+        calls.append(1)
+        time.sleep(0.5)
+        return {"short_url": "/1"}
+    
+    with ThreadPoolExecutor(1) as pool:
+        first = pool.submit(idempotency.execute, 1, key, "same", Response(), handler)
+        time.sleep(0.4)
+        with pytest.raises(HTTPException) as exc_info:
+            idempotency.execute(1, key, "same", Response(), handler)
+        assert exc_info.value.status_code == 409
+        first.result()
+    assert len(calls) == 1
+    assert redis_client.get(f"idem:1:{key}:lock") is None
+
+
+def test_client_errors_are_replayed_and_keys_are_scoped():
+    """Test that 4xx responses replay, and that a key is bound to its request and owner."""
+    key, calls = _key(), []
+    
+    def taken():
+        calls.append(1)
+        raise HTTPException(status_code=400, detail="Custom alias already taken")
+    
+    for _ in range(2):
+        with pytest.raises(HTTPException) as exc:
+            idempotency.execute(1, key, "alias", Response(), taken)
+        assert exc.value.detail == "Custom alias already taken"
+    assert len(calls) == 1
+    
+    with pytest.raises(HTTPException) as exc:
+        idempotency.execute(1, key, "other request", Response(), taken)
+    assert exc.value.status_code == 422
+    
+    assert idempotency.execute(2, key, "alias", Response(), lambda: {"ok": True}) == {"ok": True}
@@ -0,0 +1,76 @@
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy.orm import Session
+
+from src.application.db.cache import redis_client
+from src.application.schemas.url import URLCreate, URLBulkSelector
+from src.application.services import url_service
+from src.application.services import owner_stats_service
+from src.application.services.owner_stats_service import get_owner_stats, reconcile_owner_stats
+
+
+@pytest.fixture
+def owner(db: Session, test_user):
+    # Aggregates live in Redis, so start from what the database says
+    reconcile_owner_stats(db, test_user.id)
+    return test_user
+
+
+def _create(db, owner, path, **kwargs):
+    return url_service.create_url(db, URLCreate(original_url=f"https://example.com/{path}", **kwargs), owner.id)
+
+
+def test_owner_stats_follow_writes_and_flushes(db: Session, owner):
+    """Test that creates, clicks, expiry and deletes update the aggregates."""
+    popular = _create(db, owner, "popular")
+    quiet = _create(db, owner, "quiet")
+    expired = _create(db, owner, "expired", expires_at=datetime.utcnow() - timedelta(minutes=1))
+    _create(db, owner, "popular")  # duplicate target, not a new link
+    
+    for _ in range(3):
+        url_service.resolve_redirect(db, popular.short_code)
+    url_service.resolve_redirect(db, quiet.short_code)
+    
+    stats = get_owner_stats(db, owner.id)
+    assert (stats.total_links, stats.active_links, stats.expired_links) == (3, 2, 1)
+    assert stats.total_clicks == 0  # clicks count once flushed
+    
+    url_service.flush_clicks(db)
+    stats = get_owner_stats(db, owner.id, top=2)
+    assert stats.total_clicks == 4
+    assert [(link.short_code, link.access_count) for link in stats.top_links] == [
+        (popular.short_code, 3), (quiet.short_code, 1)
+    ]
+    
+    url_service.delete_url(db, popular.short_code)
+    url_service.bulk_delete_urls(db, owner.id, URLBulkSelector(short_codes=[quiet.short_code]))
+    stats = get_owner_stats(db, owner.id)
+    assert (stats.total_links, stats.active_links, stats.total_clicks) == (1, 0, 0)
+    assert [link.short_code for link in stats.top_links] == [expired.short_code]
+
+
+def test_reconcile_corrects_drift(db: Session, owner):
+    """Test that reconciliation rebuilds the aggregates from the database."""
+    url = _create(db, owner, "drift")
+    redis_client.hincrby(f"owner:{owner.id}:stats", "links", 100)
+    redis_client.zadd(f"owner:{owner.id}:top", {"ghost": 50})
+    
+    assert reconcile_owner_stats(db) >= 1
+    stats = get_owner_stats(db, owner.id)
+    assert stats.total_links == 1
+    assert [link.short_code for link in stats.top_links] == [url.short_code]
+    
+    # Aggregates that were never built are rebuilt on first read
+    redis_client.delete(f"owner:{owner.id}:stats")
+    assert get_owner_stats(db, owner.id).total_links == 1
+
+
+def test_lost_rebuild_is_not_retried_forever(db: Session, test_user, monkeypatch):
+    """Test that aggregates dropped right after their rebuild cost one retry, not a loop."""
+    calls = []
+    monkeypatch.setattr(owner_stats_service, "reconcile_owner_stats", lambda db, owner_id: calls.append(owner_id))
+    redis_client.delete(*[f"owner:{test_user.id}:{name}" for name in ("stats", "expiries", "top")])
+    
+    stats = get_owner_stats(db, test_user.id)
+    assert calls == [test_user.id]
+    assert (stats.total_links, stats.total_clicks, stats.top_links) == (0, 0, [])
@@ -0,0 +1,24 @@
+from sqlalchemy import create_engine, inspect
+
+from src.application.db.schema import upgrade_schema
+
+
+def test_upgrade_schema_adds_new_columns_and_indexes(tmp_path):
+    """Test that tables created by an older release gain the model's new columns."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as conn:
+        conn.exec_driver_sql("CREATE TABLE users (id INTEGER PRIMARY KEY, email VARCHAR, hashed_password VARCHAR, "
+                             "is_active BOOLEAN, is_superuser BOOLEAN, created_at DATETIME)")
+        conn.exec_driver_sql("CREATE TABLE urls (id INTEGER PRIMARY KEY, original_url VARCHAR, short_code VARCHAR, "
+                             "custom_alias VARCHAR, created_at DATETIME, expires_at DATETIME, "
+                             "last_accessed_at DATETIME, access_count BIGINT, owner_id INTEGER)")
+        conn.exec_driver_sql("INSERT INTO urls (original_url, short_code, access_count) VALUES ('https://example.com', 'old', 0)")
+    
+    added = upgrade_schema(engine)
+    assert {"urls.updated_at", "urls.search_key", "ix_urls_owner_search_key"} <= set(added)
+    columns = {column["name"] for column in inspect(engine).get_columns("urls")}
+    assert {"updated_at", "search_key"} <= columns
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("SELECT updated_at, search_key FROM urls").all() == [(None, None)]
+    
+    assert upgrade_schema(engine) == []
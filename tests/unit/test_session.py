@@ -0,0 +1,104 @@
+import pytest
+from types import SimpleNamespace
+from unittest.mock import Mock
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session, sessionmaker
+
+from src.application.core import deadline
+from src.application.core.metrics import metrics
+from src.application.db import session
+from src.application.db.cache import redis_client
+from src.application.db.instrumentation import track_queries
+from src.application.main import app
+from src.application.schemas.url import URLCreate
+from src.application.services import url_service
+
+
+def test_get_db_creates_session_on_first_use(monkeypatch):
+    """Test that requests that never query get no session at all."""
+    factory = Mock()
+    factory.return_value.info = {}
+    monkeypatch.setattr(session, "SessionLocal", factory)
+    
+    dependency = session.get_db()
+    next(dependency)
+    dependency.close()
+    factory.assert_not_called()
+    
+    dependency = session.get_db()
+    db = next(dependency)
+    db.execute("SELECT 1")
+    db.commit()
+    dependency.close()
+    factory.assert_called_once()
+    factory.return_value.execute.assert_called_once_with("SELECT 1")
+    factory.return_value.close.assert_called_once()
+
+
+def test_pool_checkouts_are_counted(db: Session):
+    """Test that pool checkouts and checkins show up in the metrics."""
+    before = metrics.snapshot()["counters"]
+    # The fixture session may be bound to a connection; go through the pool
+    fresh = Session(bind=db.get_bind().engine)
+    fresh.execute(text("SELECT 1"))
+    fresh.close()
+    after = metrics.snapshot()["counters"]
+    assert after["db.pool.checkouts"] == before.get("db.pool.checkouts", 0) + 1
+    assert after["db.pool.checkins"] == before.get("db.pool.checkins", 0) + 1
+
+
+def test_cached_redirect_checks_out_no_connection(db: Session, monkeypatch):
+    """Test that a redirect served from the cache never touches the pool."""
+    monkeypatch.setattr(session, "SessionLocal", sessionmaker(bind=db.get_bind().engine))
+    url = url_service.create_url(db, URLCreate(original_url="https://example.com/pool/cached"))
+    
+    def checkouts():
+        counters = metrics.snapshot()["counters"]
+        return counters.get("db.pool.checkouts", 0), counters.get("db.sessions", 0)
+    
+    with TestClient(app) as client:
+        before = checkouts()
+        response = client.get(f"/api/v1/links/{url.short_code}", follow_redirects=False)
+        assert response.status_code == 307
+        assert checkouts() == before
+        
+        # A cache miss does open a session and check a connection out
+        redis_client.delete(f"url:{url.short_code}")
+        client.get(f"/api/v1/links/{url.short_code}", follow_redirects=False)
+        after = checkouts()
+        assert after[0] > before[0] and after[1] == before[1] + 1
+
+
+def test_deadline_timeouts_ride_on_the_first_statement():
+    """Test that Postgres timeouts are prefixed to the first statement, not sent on their own."""
+    conn = SimpleNamespace(dialect=SimpleNamespace(name="postgresql"), info={})
+    cursor = Mock()
+    cursor.name = None
+    with deadline.scope(2):
+        session._apply_deadline(None, None, conn)
+    
+    statement, _ = session._send_timeouts(conn, cursor, "SELECT 1", {}, None, False)
+    assert statement.startswith("SET LOCAL statement_timeout = ")
+    assert "SET LOCAL lock_timeout = " in statement and statement.endswith("; SELECT 1")
+    assert session._send_timeouts(conn, cursor, "SELECT 2", {}, None, False)[0] == "SELECT 2"
+    cursor.connection.cursor.assert_not_called()
+    
+    # Batched statements get the timeouts from a separate statement instead
+    with deadline.scope(2):
+        session._apply_deadline(None, None, conn)
+    assert session._send_timeouts(conn, cursor, "UPDATE urls", [{}, {}], None, True)[0] == "UPDATE urls"
+    assert cursor.connection.cursor.return_value.execute.call_args[0][0].startswith("SET LOCAL")
+
+
+def test_failed_statements_leave_no_timing_state(db: Session):
+    """Test that a statement that raises is not counted and leaves the connection clean."""
+    with Session(bind=db.get_bind().engine) as fresh, track_queries() as stats:
+        connection = fresh.connection()
+        with pytest.raises(OperationalError):
+            connection.execute(text("SELECT * FROM no_such_table"))
+        fresh.rollback()
+        fresh.execute(text("SELECT 1"))
+        assert fresh.connection().info.get("query_started_at") is None
+    assert stats.statements == ["SELECT 1"]
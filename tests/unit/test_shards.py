@@ -0,0 +1,110 @@
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session, sessionmaker
+
+from src.application.db import shards, snapshot
+from src.application.db.cache import redis_client
+from src.application.db.shards import ShardRouter, create_link_tables
+from src.application.db.snapshot import RedirectSnapshot, refresh_snapshot
+from src.application.models.models import URL
+from src.application.schemas.url import URLBulkSelector, URLCreate
+from src.application.services import owner_stats_service, url_service
+
+
+@pytest.fixture
+def router(db: Session, tmp_path, monkeypatch):
+    """Three link shards: the test database plus two SQLite files."""
+    factories = [sessionmaker(bind=db.get_bind())]
+    for i in (1, 2):
+        engine = create_engine(f"sqlite:///{tmp_path / f'shard{i}.db'}", connect_args={"check_same_thread": False})
+        create_link_tables(engine)
+        factories.append(sessionmaker(autocommit=False, autoflush=False, bind=engine))
+    router = ShardRouter(factories)
+    for module in (shards, snapshot, url_service, owner_stats_service):
+        monkeypatch.setattr(module, "shard_router", router)
+    yield router
+    for session in db.info.pop("shard_sessions", {}).values():
+        session.close()
+    for engine in router.engines[1:]:
+        engine.dispose()
+
+
+def _stored_on(router: ShardRouter, db: Session, short_code: str) -> int:
+    found = [
+        shard for shard in range(router.count)
+        if router.session(db, shard).scalar(select(URL.id).where(URL.short_code == short_code)) is not None
+    ]
+    assert len(found) == 1
+    return found[0]
+
+
+def test_codes_route_to_their_shard(db: Session, router: ShardRouter, test_user):
+    """Test that generated codes land on the owner's shard and aliases on their own."""
+    generated = [
+        url_service.create_url(db, URLCreate(original_url=f"https://example.com/shard/{i}"), test_user.id)
+        for i in range(10)
+    ]
+    alias = url_service.create_url(
+        db, URLCreate(original_url="https://example.com/shard/alias", custom_alias="zz-alias"), test_user.id
+    )
+
+    home = router.home_shard(test_user.id, "")
+    for url in generated:
+        assert router.shard_for_code(url.short_code) == home
+        assert _stored_on(router, db, url.short_code) == home
+    assert _stored_on(router, db, alias.short_code) == router.shard_for_code("zz-alias")
+
+    # No directory: a cold lookup goes straight to the right database
+    for url in generated + [alias]:
+        redis_client.delete(f"url:{url.short_code}")
+        assert url_service.get_url_by_short_code(db, url.short_code).original_url == url.original_url
+
+
+def test_owner_queries_scatter_over_shards(db: Session, router: ShardRouter, test_user):
+    """Test search, batch stats, bulk operations and reconciliation across shards."""
+    aliases = ["a-one", "b-two", "c-three"]  # first characters route to shards 0, 1 and 2
+    urls = [
+        url_service.create_url(
+            db, URLCreate(original_url=f"https://example.com/scatter/{alias}", custom_alias=alias), test_user.id
+        )
+        for alias in aliases
+    ]
+    assert sorted(_stored_on(router, db, url.short_code) for url in urls) == [0, 1, 2]
+
+    found = url_service.search_url_by_original(db, "https://example.com/scatter/c-three", test_user.id)
+    assert found.short_code == "c-three"
+    page, after = url_service.search_urls(db, test_user.id, url_service.search_key_range(prefix="example.com/scatter/"))
+    assert [url.short_code for url in page] == ["a-one", "b-two", "c-three"]
+    assert after is None
+
+    redis_client.delete(*[f"url:{alias}" for alias in aliases])
+    stats = url_service.get_url_stats_batch(db, aliases + ["missing"])
+    assert [url.short_code if url else None for url in stats] == aliases + [None]
+
+    for alias in aliases:
+        url_service.resolve_redirect(db, alias)
+    url_service.flush_clicks(db)  # may also flush clicks other tests left in Redis
+    for alias in aliases:
+        shard = router.session(db, router.shard_for_code(alias))
+        assert shard.scalar(select(URL.access_count).where(URL.short_code == alias)) == 1
+    owner_stats_service.reconcile_owner_stats(db, test_user.id)
+    dashboard = owner_stats_service.get_owner_stats(db, test_user.id)
+    assert dashboard.total_links == 3
+    assert dashboard.total_clicks == 3
+
+    deleted = url_service.bulk_delete_urls(db, test_user.id, URLBulkSelector(short_codes=aliases[1:]))
+    assert sorted(deleted) == ["b-two", "c-three"]
+    assert url_service.get_url_by_short_code(db, "c-three") is None
+    assert url_service.get_url_by_short_code(db, "a-one") is not None
+
+
+def test_snapshot_merges_shards(db: Session, router: ShardRouter, tmp_path):
+    """Test that the redirect snapshot covers every shard."""
+    codes = ["c-snap", "a-snap", "b-snap"]
+    for code in codes:
+        url_service.create_url(db, URLCreate(original_url=f"https://example.com/{code}", custom_alias=code))
+
+    refresh_snapshot(db, str(tmp_path / "snap"), full_interval=3600)
+    redirects = RedirectSnapshot(str(tmp_path / "snap"), check_interval=0)
+    for code in codes:
+        assert redirects.lookup(code).original_url == f"https://example.com/{code}"
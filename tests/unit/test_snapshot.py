@@ -0,0 +1,67 @@
+import pytest
+import time
+from datetime import datetime, timedelta
+from unittest.mock import patch
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from src.application.db.cache import redis_client
+from src.application.db.snapshot import (
+    BASE_NAME, RedirectSnapshot, SnapshotFile, refresh_snapshot, write_snapshot
+)
+from src.application.schemas.url import URLCreate, URLUpdate
+from src.application.services import url_service
+
+
+def test_snapshot_lookup(tmp_path):
+    """Test binary search lookups over a written snapshot."""
+    expires = datetime(2030, 1, 1)
+    rows = [(f"code{i:04d}", f"https://example.com/{i}", expires if i % 2 else None) for i in range(1000)]
+    assert write_snapshot(tmp_path / BASE_NAME, rows, time.time()) == 1000
+    
+    snapshot = SnapshotFile(tmp_path / BASE_NAME)
+    assert snapshot.get("code0000") == ("https://example.com/0", None)
+    assert snapshot.get("code0999") == ("https://example.com/999", expires)
+    assert snapshot.get("code0500").original_url == "https://example.com/500"
+    assert snapshot.get("code") is None
+    assert snapshot.get("zzz") is None
+    
+    with pytest.raises(ValueError):
+        write_snapshot(tmp_path / "unsorted.snap", [("b", "x", None), ("a", "y", None)], time.time())
+
+
+def test_refresh_snapshot_full_then_delta(db: Session, tmp_path):
+    """Test that deltas carry changes made after the base snapshot."""
+    kept = url_service.create_url(db, URLCreate(original_url="https://example.com/snap/kept"))
+    moved = url_service.create_url(db, URLCreate(original_url="https://example.com/snap/old"))
+    expired = url_service.create_url(db, URLCreate(
+        original_url="https://example.com/snap/expired",
+        expires_at=datetime.utcnow() - timedelta(minutes=1)
+    ))
+    
+    assert refresh_snapshot(db, str(tmp_path), full_interval=3600) == "full"
+    snapshot = RedirectSnapshot(str(tmp_path), check_interval=0)
+    assert snapshot.lookup(kept.short_code).original_url == "https://example.com/snap/kept"
+    assert snapshot.lookup(expired.short_code) is None
+    
+    url_service.update_url(db, moved.short_code, URLUpdate(original_url="https://example.com/snap/new"))
+    assert refresh_snapshot(db, str(tmp_path), full_interval=3600) == "delta"
+    assert snapshot.lookup(moved.short_code).original_url == "https://example.com/snap/new"
+    assert snapshot.lookup(kept.short_code).original_url == "https://example.com/snap/kept"
+
+
+def test_resolve_redirect_falls_back_to_snapshot(db: Session, tmp_path):
+    """Test that redirects are served from the snapshot when the database fails."""
+    url = url_service.create_url(db, URLCreate(original_url="https://example.com/snap/failover"))
+    refresh_snapshot(db, str(tmp_path), full_interval=3600)
+    redis_client.delete(f"url:{url.short_code}")
+    
+    def database_down(*args, **kwargs):
+        raise OperationalError("SELECT", {}, Exception("connection refused"))
+    
+    with patch.object(url_service, "redirect_snapshot", RedirectSnapshot(str(tmp_path))), \
+            patch.object(url_service, "_fetch_url_record", database_down):
+        target = url_service.resolve_redirect(db, url.short_code)
+        assert target.original_url == "https://example.com/snap/failover"
+        with pytest.raises(OperationalError):
+            url_service.resolve_redirect(db, "missing")
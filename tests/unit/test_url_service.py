@@ -5,15 +5,24 @@ from sqlalchemy.orm import Session
 import json
 
 from src.application.services.url_service import (
+    backfill_search_keys,
     generate_short_code,
     create_url,
     get_url_by_short_code,
     update_url,
     delete_url,
-    increment_access_count
+    resolve_redirect,
+    get_url_stats,
+    get_url_stats_batch,
+    flush_clicks,
+    search_key,
+    search_key_range,
+    search_urls
 )
+from src.application.db.instrumentation import assert_max_queries
 from src.application.schemas.url import URLCreate, URLUpdate
 from src.application.models.models import URL
+from src.application.db.cache import CircuitBreaker, ShardedRedis, redis_client
 
 def test_generate_short_code():
     """Test short code generation."""
@@ -36,6 +45,19 @@ def test_create_url(db: Session):
     assert url.access_count == 0
     assert url.created_at is not None
 
+def test_create_url_deduplicates_and_rejects_taken_alias(db: Session, test_user):
+    """Test that creation reuses the owner's link and detects alias conflicts."""
+    first = create_url(db, URLCreate(original_url="https://example.com/page"), test_user.id)
+    again = create_url(db, URLCreate(original_url="https://example.com/page/"), test_user.id)
+    assert again.short_code == first.short_code
+    assert again.id == first.id
+    
+    other_owner = create_url(db, URLCreate(original_url="https://example.com/page"))
+    assert other_owner.short_code != first.short_code
+    
+    taken = create_url(db, URLCreate(original_url="https://other.com", custom_alias=first.short_code), test_user.id)
+    assert taken is None
+
 def test_get_url_by_short_code(db: Session):
     """Test URL retrieval by short code."""
     url_data = URLCreate(original_url="https://example.com")
@@ -70,21 +92,11 @@ def test_delete_url(db: Session):
     deleted_url = get_url_by_short_code(db, created_url.short_code)
     assert deleted_url is None
 
-def test_increment_access_count(db: Session):
-    """Test access count increment."""
-    url_data = URLCreate(original_url="https://example.com")
-    created_url = create_url(db, url_data)
-    
-    increment_access_count(db, created_url.short_code)
-    
-    updated_url = get_url_by_short_code(db, created_url.short_code)
-    assert updated_url.access_count == 1
-    assert updated_url.last_accessed_at is not None
-
 @patch('src.application.services.url_service.redis_client')
 def test_get_url_by_short_code_with_cache(mock_redis):
     """Test URL retrieval with Redis cache."""
     mock_redis.get.return_value = json.dumps({
+        "id": 7,
         "original_url": "https://example.com",
         "short_code": "test123",
         "expires_at": None,
@@ -98,7 +110,132 @@ def test_get_url_by_short_code_with_cache(mock_redis):
     mock_db = Mock(spec=Session)
 
     url = get_url_by_short_code(mock_db, "test123")
+    assert not mock_db.method_calls
+    assert url.id == 7
     assert url.original_url == "https://example.com"
     assert url.short_code == "test123"
     assert url.owner_id == 1
-    assert url.access_count == 0 
\ No newline at end of file
+    assert url.access_count == 0
+
+
+def test_resolve_redirect_buffers_clicks_until_flush(db: Session):
+    """Test that cached redirects count clicks in Redis and flush them to the DB."""
+    created_url = create_url(db, URLCreate(original_url="https://example.com/flush"))
+    short_code = created_url.short_code
+    
+    for _ in range(3):
+        url = resolve_redirect(db, short_code)
+        assert url.original_url == "https://example.com/flush"
+    
+    stats = get_url_stats(db, short_code)
+    assert stats.access_count == 3
+    assert stats.last_accessed_at is not None
+    assert db.query(URL).filter(URL.short_code == short_code).first().access_count == 0
+    
+    assert flush_clicks(db) == 1
+    db.expire_all()
+    assert db.query(URL).filter(URL.short_code == short_code).first().access_count == 3
+    assert get_url_stats(db, short_code).access_count == 3
+
+def test_resolve_redirect_does_not_count_expired_links(db: Session):
+    """Test that expired links are returned without counting the click."""
+    created_url = create_url(db, URLCreate(
+        original_url="https://example.com/expired",
+        expires_at=datetime.utcnow() - timedelta(minutes=1)
+    ))
+    
+    url = resolve_redirect(db, created_url.short_code)
+    assert url.expires_at is not None
+    assert get_url_stats(db, created_url.short_code).access_count == 0
+
+def test_resolve_redirect_falls_back_to_db_when_cache_is_down(db: Session, down_redis):
+    """Test that redirects keep working, and stay fast, during a Redis outage."""
+    created_url = create_url(db, URLCreate(original_url="https://example.com/outage"))
+    node = down_redis
+    down = ShardedRedis(
+        {"node-0": node},
+        breaker_factory=lambda name: CircuitBreaker(name, failure_threshold=2, reset_timeout=60)
+    )
+    
+    with patch('src.application.services.url_service.redis_client', down):
+        for _ in range(20):
+            url = resolve_redirect(db, created_url.short_code)
+            assert url.original_url == "https://example.com/outage"
+        assert get_url_stats(db, created_url.short_code).access_count == 20
+    
+    # Only the calls that opened the breaker waited on the node
+    assert node.calls == 2
+
+def test_get_url_stats_batch(db: Session):
+    """Test that batch stats keep input order and fetch misses in one query."""
+    cached = create_url(db, URLCreate(original_url="https://example.com/batch/cached"))
+    uncached = create_url(db, URLCreate(original_url="https://example.com/batch/uncached"))
+    redis_client.delete(f"url:{uncached.short_code}")
+    resolve_redirect(db, cached.short_code)
+    codes = [uncached.short_code, "missing", cached.short_code, uncached.short_code]
+    
+    with assert_max_queries(1):
+        results = get_url_stats_batch(db, codes)
+    assert [url.short_code if url else None for url in results] == [
+        uncached.short_code, None, cached.short_code, uncached.short_code
+    ]
+    assert results[2].access_count == 1  # pending click included
+    
+    # Misses were written back to the cache; only the unknown code still queries
+    with assert_max_queries(1) as stats:
+        get_url_stats_batch(db, codes)
+    assert stats.count == 1
+    with assert_max_queries(0):
+        get_url_stats_batch(db, [cached.short_code, uncached.short_code])
+
+
+def test_search_key():
+    """Test that search keys reverse the host and keep the path."""
+    assert search_key("https://www.Example.com:8443/Blog/post?id=1#top") == "com.example.www/Blog/post?id=1"
+    assert search_key("http://example.com") == "com.example/"
+    assert search_key("example.com/a") == "com.example/a"
+    assert search_key("file:///tmp/a") is None
+    assert search_key_range(domain="Example.com") == ("com.example.", "com.example0")
+    assert search_key_range(prefix="https://example.com/blog") == ("com.example/blog", "com.example/bloh")
+
+
+def test_search_urls_by_domain_and_prefix(db: Session, test_user):
+    """Test range search over search keys with keyset pagination."""
+    for path in ["https://example.com/a", "https://example.com/blog/1", "https://example.com/blog/2",
+                 "https://docs.example.com/x", "https://example.org/a", "https://notexample.com/a"]:
+        create_url(db, URLCreate(original_url=path), test_user.id)
+    create_url(db, URLCreate(original_url="https://example.com/other-owner"))
+    owner_id = test_user.id
+    
+    found, after = [], None
+    while True:
+        with assert_max_queries(1):
+            page, after = search_urls(db, owner_id, search_key_range(domain="example.com"), limit=2, after=after)
+        found.extend(url.original_url for url in page)
+        if after is None:
+            break
+    # Ordered by reversed host, so subdomains ("com.example.docs") come first
+    assert found == [
+        "https://docs.example.com/x", "https://example.com/a",
+        "https://example.com/blog/1", "https://example.com/blog/2"
+    ]
+    
+    page, after = search_urls(db, test_user.id, search_key_range(prefix="http://example.com/blog"))
+    assert [url.original_url for url in page] == ["https://example.com/blog/1", "https://example.com/blog/2"]
+    assert after is None
+
+
+def test_backfill_search_keys(db: Session, test_user):
+    """Test that links stored before search_key existed become searchable."""
+    db.add_all([
+        URL(original_url="https://example.com/old", short_code="old-1", owner_id=test_user.id, access_count=0),
+        URL(original_url="file:///tmp/old", short_code="old-2", owner_id=test_user.id, access_count=0)
+    ])
+    db.commit()
+    key_range = search_key_range(domain="example.com")
+    assert search_urls(db, test_user.id, key_range)[0] == []
+    
+    assert backfill_search_keys(db, batch_size=1) == 1
+    page, _ = search_urls(db, test_user.id, key_range)
+    assert [url.short_code for url in page] == ["old-1"]
+    assert backfill_search_keys(db) == 0